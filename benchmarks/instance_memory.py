@@ -0,0 +1,86 @@
+"""Memory taken by the instances of a large binary tree.
+
+Instances used to keep their fields in a dict of their own. They now share a
+Shape mapping field names to indexes and only hold a list of values. The
+tree below is built straight through LoxClass.call, so the number covers the
+instances alone, and then again out of DictInstance, a stand-in with the old
+layout, for comparison.
+
+Run from the repository root with ``python -m benchmarks.instance_memory``.
+"""
+import tracemalloc
+
+from attrs import define, Factory
+
+import lox
+from lox.interpreter import Interpreter
+
+DEPTH = 16
+SOURCE = """
+class Node {
+  init(left, right) {
+    this.left = left;
+    this.right = right;
+  }
+}
+"""
+
+
+@define
+class DictInstance:
+    """An instance laid out like LoxInstance before shapes."""
+
+    klass: object
+    _fields: dict[str, object] = Factory(dict)
+
+
+def build_dicts(node_class, depth: int) -> DictInstance:
+    node = DictInstance(node_class)
+    children = [None, None]
+    if depth:
+        children = [build_dicts(node_class, depth - 1) for _ in range(2)]
+    node._fields["left"], node._fields["right"] = children
+    return node
+
+
+def build(node_class, interpreter, depth: int):
+    if depth == 0:
+        return node_class.call(interpreter, [None, None])
+    return node_class.call(
+        interpreter,
+        [
+            build(node_class, interpreter, depth - 1),
+            build(node_class, interpreter, depth - 1),
+        ],
+    )
+
+
+def count(depth: int) -> int:
+    return 2 ** (depth + 1) - 1
+
+
+def measure(allocate) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = allocate()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main() -> None:
+    interpreter = Interpreter()
+    node_class = lox.compile(SOURCE).run()["Node"]
+
+    nodes = count(DEPTH)
+    shapes = measure(lambda: build(node_class, interpreter, DEPTH)) / nodes
+    dicts = measure(lambda: build_dicts(node_class, DEPTH)) / nodes
+    print(f"{nodes} nodes")
+    print(f"{shapes:>8.1f} bytes per node with shapes")
+    print(f"{dicts:>8.1f} bytes per node with a dict per instance")
+    print(f"{shapes / dicts:>8.0%} of the memory")
+
+
+if __name__ == "__main__":
+    main()
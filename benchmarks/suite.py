@@ -0,0 +1,157 @@
+"""Times the workloads in benchmarks.workloads on one or more engines.
+
+Every repetition runs a workload from source, timing scanning, parsing,
+resolving, optimising and executing separately, and the report gives the
+mean of each phase and the mean and standard deviation of the total. With
+several engines, totals are also given relative to the first one.
+
+``--save FILE`` writes the results as JSON and ``--baseline FILE`` compares
+the totals with such a file, exiting with status 1 if any of them got slower
+by more than ``--threshold``.
+
+Run from the repository root, for example with
+``python -m benchmarks.suite --engine tree vm --baseline baseline.json``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+
+from lox.closure_compiler import ClosureInterpreter
+from lox.error import ErrorHandler
+from lox.interpreter import Interpreter
+from lox.optimizer import Pipeline
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.transpiler import TranspilingInterpreter
+from lox.vm import VM
+
+from .workloads import WORKLOADS
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+    "python": TranspilingInterpreter,
+}
+PHASES = ["scan", "parse", "resolve", "optimize", "execute"]
+
+
+def run_once(source: str, engine: type[Interpreter], level: int) -> dict[str, float]:
+    """Runs source once and returns the seconds spent in each phase."""
+    error_handler = ErrorHandler()
+    times = {}
+    start = time.perf_counter()
+    tokens = Scanner(source, error_handler=error_handler).scan_tokens()
+    times["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statements = Parser(tokens, error_handler).parse()
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Resolver(error_handler).resolve(statements)
+    times["resolve"] = time.perf_counter() - start
+    if error_handler.had_error:
+        raise RuntimeError("workload does not compile")
+
+    start = time.perf_counter()
+    statements = Pipeline.for_level(level).run(statements, error_handler)
+    times["optimize"] = time.perf_counter() - start
+
+    interpreter = engine.with_time(error_handler=error_handler)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        interpreter.interpret(statements)
+    times["execute"] = time.perf_counter() - start
+    if error_handler.had_runtime_error:
+        raise RuntimeError("workload failed at runtime")
+    return times
+
+
+def measure(source: str, engine: type[Interpreter], level: int, repeat: int) -> dict:
+    runs = [run_once(source, engine, level) for _ in range(repeat)]
+    totals = [sum(run.values()) for run in runs]
+    result = {phase: statistics.mean(run[phase] for run in runs) for phase in PHASES}
+    result["total"] = statistics.mean(totals)
+    result["stdev"] = statistics.stdev(totals) if repeat > 1 else 0.0
+    return result
+
+
+def report(results: dict[str, dict[str, dict]], engines: list[str]) -> None:
+    header = "".join(f"{phase:>10}" for phase in PHASES)
+    print(f"{'workload':<14}{'engine':<9}{header}{'total ms':>18}{'ratio':>8}")
+    for workload, by_engine in results.items():
+        first = by_engine[engines[0]]["total"]
+        for engine in engines:
+            result = by_engine[engine]
+            phases = "".join(f"{result[phase] * 1e3:>10.2f}" for phase in PHASES)
+            total = f"{result['total'] * 1e3:.2f} ± {result['stdev'] * 1e3:.2f}"
+            print(
+                f"{workload:<14}{engine:<9}{phases}{total:>18}"
+                f"{result['total'] / first:>8.2f}"
+            )
+
+
+def regressions(
+    results: dict[str, dict[str, dict]], baseline: dict, threshold: float
+) -> list[str]:
+    """Describes every total that is slower than in baseline by threshold."""
+    found = []
+    for workload, by_engine in results.items():
+        for engine, result in by_engine.items():
+            before = baseline.get(workload, {}).get(engine)
+            if before is None:
+                continue
+            change = result["total"] / before["total"] - 1
+            if change > threshold:
+                found.append(f"{workload} on {engine}: {change:+.1%}")
+    return found
+
+
+parser = argparse.ArgumentParser(description="Lox benchmark suite")
+parser.add_argument("--engine", nargs="+", choices=ENGINES, default=["tree"])
+parser.add_argument("--workload", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("-O", dest="optimize", type=int, choices=[0, 1], default=1)
+parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+parser.add_argument("--baseline", metavar="FILE", help="compare with saved results")
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=0.1,
+    help="slowdown of a total that counts as a regression (default 0.1)",
+)
+
+
+def main() -> None:
+    args = parser.parse_args()
+    results = {
+        workload: {
+            engine: measure(
+                WORKLOADS[workload], ENGINES[engine], args.optimize, args.repeat
+            )
+            for engine in args.engine
+        }
+        for workload in args.workload
+    }
+    report(results, args.engine)
+
+    if args.save is not None:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.threshold)
+        for regression in found:
+            print(f"regression: {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
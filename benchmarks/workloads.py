@@ -0,0 +1,174 @@
+"""Lox programs run by the benchmark suite, keyed by name.
+
+Each one exercises a different part of the interpreter and runs for up to
+half a second on the tree-walking engine.
+"""
+
+
+def _large_source(functions: int) -> str:
+    # many small declarations, of which only the last is called: mostly
+    # scanning, parsing and resolving
+    lines = [
+        f"fun f{i}(a, b) {{ var c = a * {i} + b; if (c > {i}) return c; return -c; }}"
+        for i in range(functions)
+    ]
+    lines.append(f"print f{functions - 1}(1, 2);")
+    return "\n".join(lines)
+
+
+def _assignments(nesting: int) -> str:
+    # the right operand is never evaluated: with -O0, time that grows with
+    # nesting would come from looking up the assigned variable
+    value = "i"
+    for _ in range(nesting):
+        value = f"({value})"
+    return f"""
+fun assign() {{
+  var t = true;
+  var a;
+  for (var i = 0; i < 50000; i = i + 1) a = t or {value};
+  return a;
+}}
+print assign();
+"""
+
+
+def _long_strings(megabytes: int) -> str:
+    # a long string grown by 100 characters at a time, which takes time
+    # linear in its length as long as `+` doesn't copy it every time
+    piece = "0123456789" * 10
+    return f"""
+var text = "";
+for (var i = 0; i < {megabytes * 1_000_000 // len(piece)}; i = i + 1) {{
+  text = text + "{piece}";
+}}
+"""
+
+
+WORKLOADS = {
+    "fib": """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(20);
+""",
+    "binary_trees": """
+class Tree {
+  init(left, right) {
+    this.left = left;
+    this.right = right;
+  }
+  check() {
+    if (this.left == nil) return 1;
+    return 1 + this.left.check() + this.right.check();
+  }
+}
+fun make(depth) {
+  if (depth == 0) return Tree(nil, nil);
+  return Tree(make(depth - 1), make(depth - 1));
+}
+var total = 0;
+for (var i = 0; i < 4; i = i + 1) total = total + make(10).check();
+print total;
+""",
+    "method_zoo": """
+class Circle {
+  init(r) { this.r = r; }
+  area() { return 3 * this.r * this.r; }
+  scale(k) { this.r = this.r * k; return this; }
+}
+class Square {
+  init(side) { this.side = side; }
+  area() { return this.side * this.side; }
+  scale(k) { this.side = this.side * k; return this; }
+}
+class Rect {
+  init(w, h) { this.w = w; this.h = h; }
+  area() { return this.w * this.h; }
+  scale(k) { this.w = this.w * k; this.h = this.h * k; return this; }
+}
+var kind = 0;
+var sum = 0;
+for (var i = 0; i < 6000; i = i + 1) {
+  var shape = Circle(i);
+  if (kind == 1) shape = Square(i);
+  if (kind == 2) shape = Rect(i, 2);
+  sum = sum + shape.scale(0.5).area();
+  kind = kind + 1;
+  if (kind == 3) kind = 0;
+}
+print sum;
+""",
+    "strings": """
+var text = "";
+var words = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  text = text + "lox";
+  if (text == "loxlox") words = words + 1;
+}
+print words;
+""",
+    "closures": """
+fun counter() {
+  var count = 0;
+  fun increment(by) {
+    count = count + by;
+    return count;
+  }
+  return increment;
+}
+var total = 0;
+for (var i = 0; i < 300; i = i + 1) {
+  var c = counter();
+  for (var j = 0; j < 50; j = j + 1) total = total + c(j);
+}
+print total;
+""",
+    "instantiation": """
+class Point {
+  init(x, y, z) {
+    this.x = x;
+    this.y = y;
+    this.z = z;
+  }
+}
+var last = nil;
+for (var i = 0; i < 20000; i = i + 1) last = Point(i, i + 1, i + 2);
+print last.z;
+""",
+    "deep_loops": """
+var sum = 0;
+for (var i = 0; i < 40; i = i + 1) {
+  for (var j = 0; j < 40; j = j + 1) {
+    for (var k = 0; k < 40; k = k + 1) {
+      sum = sum + i * j - k;
+    }
+  }
+}
+print sum;
+""",
+    "large_source": _large_source(2000),
+    "call_overhead": """
+fun identity(x) { return x; }
+fun branch(x) { if (x) { return 1; } return 2; }
+fun loop(x) { while (true) { return x; } }
+for (var i = 0; i < 25000; i = i + 1) {
+  identity(i);
+  branch(i);
+  loop(i);
+}
+""",
+    "numeric_loop": """
+var sum = 0;
+var text = "";
+for (var i = 0; i < 30000; i = i + 1) {
+  var x = i * 2 - -1;
+  if (x >= 10 and x <= 20) text = text + "x";
+  sum = sum + x / 2;
+}
+print sum;
+""",
+    "assignments": _assignments(50),
+    "long_strings": _long_strings(1),
+}
@@ -0,0 +1,4 @@
+__version__ = "0.1.0"
+
+from .error import ProgramError
+from .program import Program, compile
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import attrs
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from . import __version__, expr, stmt
+from .stmt import Stmt
+
+# Compiled programs live next to their source, like Python's __pycache__:
+#   <dir>/__loxcache__/<stem>.lox-<version>.O<level>.bin
+# A file starts with MAGIC and the digest of everything the program was
+# compiled from, followed by the pickled statements.
+DIRECTORY = "__loxcache__"
+MAGIC = b"LOXC"
+
+# the pickled statements are only readable by the node classes they were
+# written with, so their fields are part of the key as well
+_LAYOUT = repr(
+    [
+        (name, [field.name for field in attrs.fields(node)])
+        for module in (expr, stmt)
+        for name, node in sorted(vars(module).items())
+        if isinstance(node, type) and attrs.has(node)
+    ]
+)
+
+
+def cache_path(filename: str, level: int) -> Path:
+    source = Path(filename)
+    name = f"{source.stem}.lox-{__version__}.O{level}.bin"
+    return source.parent / DIRECTORY / name
+
+
+def digest(source: str, level: int) -> bytes:
+    key = hashlib.sha256(f"{__version__}\0{_LAYOUT}\0{level}\0".encode())
+    key.update(source.encode())
+    return key.digest()
+
+
+def load(filename: str, source: str, level: int) -> list[Stmt] | None:
+    """Returns the cached program for source, or None if there is none."""
+    try:
+        with open(cache_path(filename, level), "rb") as file:
+            header = file.read(len(MAGIC) + 32)
+            if header != MAGIC + digest(source, level):
+                return None
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        # a missing, stale or unreadable cache only costs a recompile
+        return None
+
+
+def store(filename: str, source: str, level: int, statements: list[Stmt]) -> None:
+    path = cache_path(filename, level)
+    try:
+        data = pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        # deeply nested programs are not worth crashing over
+        return
+    try:
+        path.parent.mkdir(exist_ok=True)
+        # write to a private file first so readers never see half a program
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "wb") as file:
+            file.write(MAGIC + digest(source, level))
+            file.write(data)
+        os.replace(temporary, path)
+    except OSError:
+        return
@@ -1,7 +1,8 @@
 from __future__ import annotations
-from attrs import define, Factory
+from collections import OrderedDict
+from attrs import define, field, Factory
 from .stmt import Function
-from .environment import Environment
+from .environment import Environment, GlobalEnvironment
 from .error import LoxRuntimeError
 from .token import Token
 
@@ -15,43 +16,147 @@ class LoxCallable:
         raise NotImplemented
 
 
+@define
+class TailCall:
+    """A call in tail position, left for the caller's LoxFunction to run."""
+
+    function: LoxFunction
+    this: LoxInstance | None
+    arguments: list[object]
+
+
 @define
 class LoxFunction(LoxCallable):
     _declaration: Function
-    _closure: Environment
+    _closure: Environment | GlobalEnvironment
     _is_initializer: bool
 
+    @property
+    def declaration(self) -> Function:
+        return self._declaration
+
     def bind(self, instance: LoxInstance) -> LoxFunction:
-        environment = Environment(self._closure)
-        environment.define("this", instance)
+        environment = Environment(self._closure, [instance])
         return LoxFunction(self._declaration, environment, self._is_initializer)
 
     def arity(self) -> int:
         return len(self._declaration.parameters)
 
     def call(self, interpreter, arguments: list[object]) -> object:
-        environment = Environment(self._closure)
-        for i, parameter in enumerate(self._declaration.parameters):
-            environment.define(parameter.lexeme, arguments[i])
-
-        try:
-            interpreter.execute_block(self._declaration.body, environment)
-        except interpreter.RuntimeReturn as return_value:
-            if self._is_initializer:
-                return self._closure.get_at(0, "this")
-            return return_value.value
-        if self._is_initializer:
-            return self._closure.get_at(0, "this")
-        return None
+        # parameters occupy the first slots of the function's scope
+        return self._execute(interpreter, Environment(self._closure, list(arguments)))
+
+    def call_method(
+        self, interpreter, instance: LoxInstance, arguments: list[object]
+    ) -> object:
+        """Calls this unbound method on instance, as bind(instance).call would."""
+        this = Environment(self._closure, [instance])
+        return self._execute(interpreter, Environment(this, list(arguments)))
+
+    def _execute(self, interpreter, environment: Environment) -> object:
+        function = self
+        while True:
+            completion = interpreter.execute_block(
+                function._declaration.body, environment
+            )
+            value = None if completion is None else completion[0]
+            if type(value) is not TailCall:
+                break
+            # run the callee in this Python frame instead of nesting
+            function = value.function
+            environment = function._closure
+            if value.this is not None:
+                environment = Environment(environment, [value.this])
+            environment = Environment(environment, value.arguments)
+        if function._is_initializer:
+            return environment.get_at(1, 0)
+        return value
 
     def __str__(self) -> str:
         return f"<fn {self._declaration.name.lexeme}>"
 
 
+@define
+class LRUCache:
+    """Results of a pure function by arguments, keeping the maxsize latest."""
+
+    maxsize: int
+    hits: int = 0
+    misses: int = 0
+    _entries: OrderedDict = Factory(OrderedDict)
+
+    def get(self, key: tuple, default: object = None) -> object:
+        value = self._entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value: object) -> None:
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+_MISSING = object()
+
+
+@define
+class MemoizedFunction(LoxFunction):
+    """A function the resolver found pure, calling through an LRUCache."""
+
+    _cache: LRUCache
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        # 1.0 == True in Python, so the types go into the key as well, and
+        # 0.0 == -0.0, which print differently, so floats go in as hex()
+        key = (
+            *map(type, arguments),
+            *[a.hex() if type(a) is float else a for a in arguments],
+        )
+        try:
+            value = self._cache.get(key, _MISSING)
+        except TypeError:
+            # functions and classes can't be hashed
+            return super().call(interpreter, arguments)
+        if value is _MISSING:
+            value = super().call(interpreter, arguments)
+            self._cache.put(key, value)
+        return value
+
+
+@define(eq=False)
+class Shape:
+    """The layout shared by all instances that got the same fields in order.
+
+    Instances keep their field values in a list indexed by the shape's
+    slots. Adding a field moves an instance along a transition to the next
+    shape, which is created once and then shared by every instance that
+    takes the same path, so a shape also identifies a layout in caches.
+    """
+
+    klass: LoxClass
+    slots: dict[str, int] = Factory(dict)
+    _transitions: dict[str, Shape] = Factory(dict)
+
+    def with_field(self, name: str) -> Shape:
+        shape = self._transitions.get(name)
+        if shape is None:
+            slots = {**self.slots, name: len(self.slots)}
+            shape = self._transitions.setdefault(name, Shape(self.klass, slots))
+        return shape
+
+
 @define
 class LoxClass(LoxCallable):
     name: str
     methods: dict[str, LoxFunction]
+    # shape of instances without any fields
+    shape: Shape = field(
+        default=Factory(lambda self: Shape(self), takes_self=True), repr=False
+    )
 
     def arity(self) -> int:
         initializer = self.find_method("init")
@@ -60,9 +165,9 @@ class LoxClass(LoxCallable):
         return initializer.arity()
 
     def call(self, interpreter, arguments: list[object]) -> object:
-        instance = LoxInstance(self)
+        instance = LoxInstance(self.shape)
         if initializer := self.find_method("init"):
-            initializer.bind(instance).call(interpreter, arguments)
+            initializer.call_method(interpreter, instance, arguments)
         return instance
 
     def find_method(self, name: str) -> LoxFunction | None:
@@ -72,21 +177,43 @@ class LoxClass(LoxCallable):
         return self.name
 
 
-@define
+@define(eq=False)
 class LoxInstance:
-    klass: LoxClass
-    _fields: dict[str, object] = Factory(dict)
+    # created with the shape of its class; the class is reached through it
+    shape: Shape
+    values: list[object] = Factory(list)
+
+    @property
+    def klass(self) -> LoxClass:
+        return self.shape.klass
+
+    def lookup(self, name: Token) -> int | LoxFunction:
+        """Returns the index of the field called name, or else the method.
+
+        The answer only depends on the shape, so callers may cache it per
+        shape.
+        """
+        index = self.shape.slots.get(name.lexeme)
+        if index is not None:
+            return index
+        method = self.klass.find_method(name.lexeme)
+        if method is None:
+            raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+        return method
 
     def get(self, name: Token) -> object:
-        if name.lexeme in self._fields:
-            return self._fields[name.lexeme]
-        method = self.klass.find_method(name.lexeme)
-        if method is not None:
-            return method.bind(self)
-        raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+        found = self.lookup(name)
+        if type(found) is int:
+            return self.values[found]
+        return found.bind(self)
 
     def set(self, name: Token, value: object) -> None:
-        self._fields[name.lexeme] = value
+        index = self.shape.slots.get(name.lexeme)
+        if index is None:
+            self.shape = self.shape.with_field(name.lexeme)
+            self.values.append(value)
+        else:
+            self.values[index] = value
 
     def __str__(self) -> str:
         return f"{self.klass.name} instance"
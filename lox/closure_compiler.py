@@ -0,0 +1,550 @@
+from __future__ import annotations
+import operator
+from attrs import define
+from typing import Callable
+from .callable import LoxCallable, LoxClass, LoxFunction, LoxInstance, TailCall
+from .environment import Environment, GlobalEnvironment
+from .error import LoxRuntimeError, NativeError
+from .expr import *
+from .interpreter import Interpreter
+from .rope import concat, is_string
+from .stmt import *
+from .token import Token
+from .token_type import *
+
+Scope = Environment | GlobalEnvironment
+# Compiled code is called with the interpreter running it, which holds the
+# globals and stdout of the run, and the scope. A compiled expression
+# evaluates to its value. A compiled statement returns None when it completes
+# normally and a 1-tuple holding the value when it executed a `return`.
+CompiledExpr = Callable[[Interpreter, Scope], object]
+CompiledStmt = Callable[[Interpreter, Scope], tuple[object] | None]
+
+_NUMERIC_OPERATIONS: dict[TokenType, Callable[[float, float], object]] = {
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+}
+
+
+@define
+class CompiledFunction(LoxFunction):
+    _body: CompiledStmt
+
+    def bind(self, instance: LoxInstance) -> CompiledFunction:
+        environment = Environment(self._closure, [instance])
+        return CompiledFunction(
+            self._declaration, environment, self._is_initializer, self._body
+        )
+
+    def _execute(self, interpreter, environment: Environment) -> object:
+        function = self
+        while True:
+            result = function._body(interpreter, environment)
+            value = None if result is None else result[0]
+            if type(value) is not TailCall:
+                break
+            # run the callee in this Python frame instead of nesting, as
+            # LoxFunction._execute does
+            function = value.function
+            environment = function._closure
+            if value.this is not None:
+                environment = Environment(environment, [value.this])
+            environment = Environment(environment, value.arguments)
+        if function._is_initializer:
+            return environment.enclosing.values[0]
+        return value
+
+
+@define
+class ClosureCompiler:
+    """Compiles a resolved program into nested Python closures.
+
+    Every node is translated once into a closure specialised for its operator
+    or the resolved location of its variable, so executing the program does
+    no visitor dispatch at all. The closures keep no state of a run, so any
+    number of interpreters can run them.
+    """
+
+    def compile(self, statements: list[Stmt]) -> list[CompiledStmt]:
+        return [self._statement(statement) for statement in statements]
+
+    def _statement(self, stmt: Stmt) -> CompiledStmt:
+        return stmt.visit(self)
+
+    def _expression(self, expr: Expr) -> CompiledExpr:
+        return expr.visit(self)
+
+    def _body(self, statements: list[Stmt]) -> CompiledStmt:
+        compiled = self.compile(statements)
+
+        def body(interpreter, env):
+            for statement in compiled:
+                result = statement(interpreter, env)
+                if result is not None:
+                    return result
+            return None
+
+        return body
+
+    def _define(
+        self, name: str, slot: int | None
+    ) -> Callable[[Interpreter, Scope, object], None]:
+        if slot is None:
+
+            def define_global(interpreter, env, value):
+                interpreter.global_env.values[name] = value
+
+            return define_global
+
+        def define_local(interpreter, env, value):
+            env.define(slot, value)
+
+        return define_local
+
+    def visit_block_stmt(self, stmt: Block) -> CompiledStmt:
+        body = self._body(stmt.statements)
+
+        def block(interpreter, env):
+            return body(interpreter, Environment(env))
+
+        return block
+
+    def visit_class_stmt(self, stmt: Class) -> CompiledStmt:
+        name = stmt.name.lexeme
+        methods = [(method, self._body(method.body)) for method in stmt.methods]
+        define = self._define(name, stmt.slot)
+
+        def klass(interpreter, env):
+            functions: dict[str, LoxFunction] = {}
+            for method, body in methods:
+                is_initializer = method.name.lexeme == "init"
+                functions[method.name.lexeme] = CompiledFunction(
+                    method, env, is_initializer, body
+                )
+            define(interpreter, env, LoxClass(name, functions))
+
+        return klass
+
+    def visit_expression_stmt(self, stmt: Expression) -> CompiledStmt:
+        expression = self._expression(stmt.expression)
+
+        def expression_statement(interpreter, env):
+            expression(interpreter, env)
+
+        return expression_statement
+
+    def visit_function_stmt(self, stmt: Function) -> CompiledStmt:
+        body = self._body(stmt.body)
+        define = self._define(stmt.name.lexeme, stmt.slot)
+
+        def function(interpreter, env):
+            define(interpreter, env, CompiledFunction(stmt, env, False, body))
+
+        return function
+
+    def visit_if_stmt(self, stmt: If) -> CompiledStmt:
+        condition = self._expression(stmt.condition)
+        then_branch = self._statement(stmt.then_branch)
+        if stmt.else_branch is None:
+
+            def if_then(interpreter, env):
+                value = condition(interpreter, env)
+                if value is not None and value is not False:
+                    return then_branch(interpreter, env)
+                return None
+
+            return if_then
+
+        else_branch = self._statement(stmt.else_branch)
+
+        def if_then_else(interpreter, env):
+            value = condition(interpreter, env)
+            if value is not None and value is not False:
+                return then_branch(interpreter, env)
+            return else_branch(interpreter, env)
+
+        return if_then_else
+
+    def visit_print_stmt(self, stmt: Print) -> CompiledStmt:
+        expression = self._expression(stmt.expression)
+
+        def print_statement(interpreter, env):
+            value = expression(interpreter, env)
+            print(interpreter.stringify(value), file=interpreter.stdout)
+
+        return print_statement
+
+    def visit_return_stmt(self, stmt: Return) -> CompiledStmt:
+        if stmt.value is None:
+            return lambda interpreter, env: (None,)
+        if stmt.tail_call:
+            return self._tail_call(stmt.value)
+        value = self._expression(stmt.value)
+        return lambda interpreter, env: (value(interpreter, env),)
+
+    def _tail_call(self, expr: Call) -> CompiledStmt:
+        """`return f(...)`, leaving calls of CompiledFunctions to the caller.
+
+        CompiledFunction._execute runs the TailCall returned in their place.
+        """
+        arguments = [self._expression(argument) for argument in expr.arguments]
+        paren = expr.paren
+        if type(expr.callee) is Get:
+            obj = self._expression(expr.callee.expr_object)
+            name = expr.callee.name
+            lookup = self._lookup(name)
+
+            def callee(interpreter, env):
+                instance = obj(interpreter, env)
+                if not isinstance(instance, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have properties.")
+                method = lookup(instance)
+                if type(method) is int:
+                    return instance.values[method], None
+                return method, instance
+
+        else:
+            function = self._expression(expr.callee)
+
+            def callee(interpreter, env):
+                return function(interpreter, env), None
+
+        def tail_call(interpreter, env):
+            function, this = callee(interpreter, env)
+            values = [argument(interpreter, env) for argument in arguments]
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise LoxRuntimeError(
+                    paren,
+                    f"Expected {function.arity()} arguments but got {len(values)}.",
+                )
+            if type(function) is CompiledFunction:
+                return (TailCall(function, this, values),)
+            try:
+                if this is not None:
+                    return (function.call_method(interpreter, this, values),)
+                return (function.call(interpreter, values),)
+            except NativeError as e:
+                raise LoxRuntimeError(paren, e.message) from None
+
+        return tail_call
+
+    def visit_var_stmt(self, stmt: Var) -> CompiledStmt:
+        define = self._define(stmt.name.lexeme, stmt.slot)
+        if stmt.initializer is None:
+
+            def declare(interpreter, env):
+                define(interpreter, env, None)
+
+            return declare
+
+        initializer = self._expression(stmt.initializer)
+
+        def declare_initialized(interpreter, env):
+            define(interpreter, env, initializer(interpreter, env))
+
+        return declare_initialized
+
+    def visit_while_stmt(self, stmt: While) -> CompiledStmt:
+        condition = self._expression(stmt.condition)
+        body = self._statement(stmt.body)
+
+        def loop(interpreter, env):
+            while True:
+                value = condition(interpreter, env)
+                if value is None or value is False:
+                    return None
+                result = body(interpreter, env)
+                if result is not None:
+                    return result
+
+        return loop
+
+    def visit_assign_expr(self, expr: Assign) -> CompiledExpr:
+        value = self._expression(expr.value)
+        depth, slot = expr.depth, expr.slot
+        if depth is None:
+            name = expr.name
+
+            def assign_global(interpreter, env):
+                result = value(interpreter, env)
+                values = interpreter.global_env.values
+                if name.lexeme not in values:
+                    raise LoxRuntimeError(
+                        name, f"Undefined variable '{name.lexeme}'."
+                    )
+                values[name.lexeme] = result
+                return result
+
+            return assign_global
+        if depth == 0:
+
+            def assign_local(interpreter, env):
+                result = env.values[slot] = value(interpreter, env)
+                return result
+
+            return assign_local
+
+        def assign_enclosing(interpreter, env):
+            result = env.ancestor(depth).values[slot] = value(interpreter, env)
+            return result
+
+        return assign_enclosing
+
+    def visit_binary_expr(self, expr: Binary) -> CompiledExpr:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        token = expr.operator
+
+        match token.token_type:
+            case TokenType.EQUAL_EQUAL:
+
+                def equal(interpreter, env):
+                    a = left(interpreter, env)
+                    return interpreter.is_equal(a, right(interpreter, env))
+
+                return equal
+            case TokenType.BANG_EQUAL:
+
+                def not_equal(interpreter, env):
+                    a = left(interpreter, env)
+                    return not interpreter.is_equal(a, right(interpreter, env))
+
+                return not_equal
+            case TokenType.PLUS:
+
+                def add(interpreter, env):
+                    a = left(interpreter, env)
+                    b = right(interpreter, env)
+                    if type(a) is float and type(b) is float:
+                        return a + b
+                    if is_string(a) and is_string(b):
+                        return concat(a, b)
+                    raise LoxRuntimeError(
+                        token, "Operands must be two numbers or two strings."
+                    )
+
+                return add
+
+        operation = _NUMERIC_OPERATIONS[token.token_type]
+
+        def arithmetic(interpreter, env):
+            a = left(interpreter, env)
+            b = right(interpreter, env)
+            if type(a) is float and type(b) is float:
+                return operation(a, b)
+            raise LoxRuntimeError(token, "Operands must be numbers.")
+
+        return arithmetic
+
+    def _lookup(self, name: Token) -> Callable[[LoxInstance], int | LoxFunction]:
+        """Returns LoxInstance.lookup behind its own monomorphic inline cache."""
+        cache: tuple[object, int | LoxFunction | None] = (None, None)
+
+        def lookup(instance):
+            nonlocal cache
+            if cache[0] is instance.shape:
+                return cache[1]
+            found = instance.lookup(name)
+            cache = (instance.shape, found)
+            return found
+
+        return lookup
+
+    def visit_call_expr(self, expr: Call) -> CompiledExpr:
+        if type(expr.callee) is Get:
+            return self._call_property(expr, expr.callee)
+
+        callee = self._expression(expr.callee)
+        arguments = [self._expression(argument) for argument in expr.arguments]
+        paren = expr.paren
+
+        def call(interpreter, env):
+            function = callee(interpreter, env)
+            values = [argument(interpreter, env) for argument in arguments]
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise LoxRuntimeError(
+                    paren,
+                    f"Expected {function.arity()} arguments but got {len(values)}.",
+                )
+            try:
+                return function.call(interpreter, values)
+            except NativeError as e:
+                raise LoxRuntimeError(paren, e.message) from None
+
+        return call
+
+    def _call_property(self, expr: Call, get: Get) -> CompiledExpr:
+        # `obj.name(...)` calls a method without creating a bound function
+        obj = self._expression(get.expr_object)
+        arguments = [self._expression(argument) for argument in expr.arguments]
+        name = get.name
+        lookup = self._lookup(name)
+        paren = expr.paren
+
+        def call_property(interpreter, env):
+            instance = obj(interpreter, env)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties.")
+            method = lookup(instance)
+            if type(method) is not int:
+                values = [argument(interpreter, env) for argument in arguments]
+                if len(values) != method.arity():
+                    raise LoxRuntimeError(
+                        paren,
+                        f"Expected {method.arity()} arguments but got {len(values)}.",
+                    )
+                try:
+                    return method.call_method(interpreter, instance, values)
+                except NativeError as e:
+                    raise LoxRuntimeError(paren, e.message) from None
+
+            function = instance.values[method]
+            values = [argument(interpreter, env) for argument in arguments]
+            if not isinstance(function, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise LoxRuntimeError(
+                    paren,
+                    f"Expected {function.arity()} arguments but got {len(values)}.",
+                )
+            try:
+                return function.call(interpreter, values)
+            except NativeError as e:
+                raise LoxRuntimeError(paren, e.message) from None
+
+        return call_property
+
+    def visit_get_expr(self, expr: Get) -> CompiledExpr:
+        obj = self._expression(expr.expr_object)
+        name = expr.name
+        lookup = self._lookup(name)
+
+        def get(interpreter, env):
+            instance = obj(interpreter, env)
+            if isinstance(instance, LoxInstance):
+                found = lookup(instance)
+                if type(found) is int:
+                    return instance.values[found]
+                return found.bind(instance)
+            raise LoxRuntimeError(name, "Only instances have properties.")
+
+        return get
+
+    def visit_grouping_expr(self, expr: Grouping) -> CompiledExpr:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> CompiledExpr:
+        value = expr.value
+        return lambda interpreter, env: value
+
+    def visit_logical_expr(self, expr: Logical) -> CompiledExpr:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        if expr.operator.token_type == OR:
+
+            def logical_or(interpreter, env):
+                value = left(interpreter, env)
+                if value is not None and value is not False:
+                    return value
+                return right(interpreter, env)
+
+            return logical_or
+
+        def logical_and(interpreter, env):
+            value = left(interpreter, env)
+            if value is None or value is False:
+                return value
+            return right(interpreter, env)
+
+        return logical_and
+
+    def visit_set_expr(self, expr: Set) -> CompiledExpr:
+        obj = self._expression(expr.expr_object)
+        value = self._expression(expr.value)
+        name = expr.name
+
+        def set_property(interpreter, env):
+            instance = obj(interpreter, env)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have fields.")
+            result = value(interpreter, env)
+            instance.set(name, result)
+            return result
+
+        return set_property
+
+    def visit_this_expr(self, expr: This) -> CompiledExpr:
+        return self._local(expr.depth, expr.slot)
+
+    def visit_unary_expr(self, expr: Unary) -> CompiledExpr:
+        right = self._expression(expr.right)
+        token = expr.operator
+        if token.token_type == BANG:
+
+            def logical_not(interpreter, env):
+                value = right(interpreter, env)
+                return value is None or value is False
+
+            return logical_not
+
+        def negate(interpreter, env):
+            value = right(interpreter, env)
+            if type(value) is float:
+                return -value
+            raise LoxRuntimeError(token, "Operand must be a number.")
+
+        return negate
+
+    def visit_variable_expr(self, expr: Variable) -> CompiledExpr:
+        if expr.depth is not None:
+            return self._local(expr.depth, expr.slot)
+
+        name = expr.name
+
+        def get_global(interpreter, env):
+            try:
+                return interpreter.global_env.values[name.lexeme]
+            except KeyError:
+                raise LoxRuntimeError(
+                    name, f"Undefined variable '{name.lexeme}'."
+                ) from None
+
+        return get_global
+
+    def _local(self, depth: int, slot: int) -> CompiledExpr:
+        match depth:
+            case 0:
+                return lambda interpreter, env: env.values[slot]
+            case 1:
+                return lambda interpreter, env: env.enclosing.values[slot]
+            case 2:
+                return lambda interpreter, env: env.enclosing.enclosing.values[slot]
+        return lambda interpreter, env: env.ancestor(depth).values[slot]
+
+
+@define
+class ClosureInterpreter(Interpreter):
+    """Runs programs by compiling them with the ClosureCompiler first."""
+
+    @classmethod
+    def prepare(cls, statements: list[Stmt]) -> list[CompiledStmt]:
+        return ClosureCompiler().compile(statements)
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        self.run_prepared(self.prepare(statements))
+
+    def run_prepared(self, program: list[CompiledStmt]) -> None:
+        try:
+            for statement in program:
+                statement(self, self.global_env)
+        except LoxRuntimeError as e:
+            self.error_handler.runtime_error(e)
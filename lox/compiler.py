@@ -0,0 +1,320 @@
+from __future__ import annotations
+from attrs import define, Factory
+from enum import IntEnum
+from .expr import *
+from .stmt import *
+from .token import Token
+from .token_type import *
+
+OpCode = IntEnum(
+    "OpCode",
+    [
+        "CONSTANT",
+        "NIL",
+        "TRUE",
+        "FALSE",
+        "POP",
+        "GET_LOCAL",
+        "SET_LOCAL",
+        "DEFINE_LOCAL",
+        "GET_GLOBAL",
+        "SET_GLOBAL",
+        "DEFINE_GLOBAL",
+        "GET_PROPERTY",
+        "SET_PROPERTY",
+        "EQUAL",
+        "GREATER",
+        "GREATER_EQUAL",
+        "LESS",
+        "LESS_EQUAL",
+        "ADD",
+        "SUBTRACT",
+        "MULTIPLY",
+        "DIVIDE",
+        "NOT",
+        "NEGATE",
+        "PRINT",
+        "JUMP",
+        "JUMP_IF_FALSE",
+        "JUMP_IF_TRUE",
+        "POP_JUMP_IF_FALSE",
+        "PUSH_SCOPE",
+        "POP_SCOPE",
+        "CALL",
+        "CLOSURE",
+        "CLASS",
+        "RETURN",
+    ],
+)
+
+# number of operands following each opcode in the code array
+OPERAND_COUNTS = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 2,
+    OpCode.SET_LOCAL: 2,
+    OpCode.DEFINE_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.JUMP_IF_TRUE: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.CALL: 1,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 2,
+}
+
+_BINARY_OPCODES = {
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+}
+
+
+@define
+class Chunk:
+    """Flat bytecode: opcodes and their operands share one int array."""
+
+    code: list[int] = Factory(list)
+    constants: list[object] = Factory(list)
+    # source line of every entry in code
+    lines: list[int] = Factory(list)
+
+    def write(self, line: int, opcode: OpCode, *operands: int) -> int:
+        """Appends an instruction and returns the index of its first operand."""
+        self.code.append(opcode.value)
+        self.code.extend(operands)
+        self.lines.extend([line] * (1 + len(operands)))
+        return len(self.code) - len(operands)
+
+    def add_constant(self, value: object) -> int:
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def disassemble(self) -> list[str]:
+        instructions = []
+        offset = 0
+        while offset < len(self.code):
+            opcode = OpCode(self.code[offset])
+            count = OPERAND_COUNTS.get(opcode, 0)
+            operands = self.code[offset + 1 : offset + 1 + count]
+            text = f"{offset:04d} {self.lines[offset]:4d} {opcode.name}"
+            if operands:
+                text += " " + " ".join(map(str, operands))
+            if opcode in (OpCode.CONSTANT, OpCode.CLOSURE):
+                text += f" ({self.constants[operands[0]]})"
+            instructions.append(text)
+            offset += 1 + count
+        return instructions
+
+
+@define
+class FunctionProto:
+    """A compiled function body; instantiated into closures at runtime."""
+
+    name: str
+    chunk: Chunk = Factory(Chunk)
+    declaration: Function | None = None
+    is_initializer: bool = False
+
+    def __str__(self) -> str:
+        return f"<proto {self.name}>"
+
+
+@define
+class Compiler:
+    """Lowers a resolved program to bytecode for the VM."""
+
+    _proto: FunctionProto = Factory(lambda: FunctionProto("script"))
+    _line: int = 1
+
+    def compile(self, statements: list[Stmt]) -> FunctionProto:
+        for statement in statements:
+            statement.visit(self)
+        self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+        return self._proto
+
+    def _emit(self, opcode: OpCode, *operands: int) -> int:
+        return self._proto.chunk.write(self._line, opcode, *operands)
+
+    def _constant(self, value: object) -> int:
+        return self._proto.chunk.add_constant(value)
+
+    def _here(self) -> int:
+        return len(self._proto.chunk.code)
+
+    def _patch(self, operand: int, target: int) -> None:
+        self._proto.chunk.code[operand] = target
+
+    def _expression(self, expr: Expr) -> None:
+        expr.visit(self)
+
+    def _define(self, name: Token, slot: int | None) -> None:
+        self._line = name.line
+        if slot is None:
+            self._emit(OpCode.DEFINE_GLOBAL, self._constant(name))
+        else:
+            self._emit(OpCode.DEFINE_LOCAL, slot)
+
+    def _function(self, stmt: Function, is_initializer: bool) -> None:
+        proto = FunctionProto(
+            stmt.name.lexeme, declaration=stmt, is_initializer=is_initializer
+        )
+        enclosing = self._proto
+        self._proto = proto
+        for statement in stmt.body:
+            statement.visit(self)
+        self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+        self._proto = enclosing
+        self._line = stmt.name.line
+        self._emit(OpCode.CLOSURE, self._constant(proto))
+
+    def visit_block_stmt(self, stmt: Block) -> None:
+        self._emit(OpCode.PUSH_SCOPE)
+        for statement in stmt.statements:
+            statement.visit(self)
+        self._emit(OpCode.POP_SCOPE)
+
+    def visit_class_stmt(self, stmt: Class) -> None:
+        for method in stmt.methods:
+            self._function(method, method.name.lexeme == "init")
+        self._line = stmt.name.line
+        self._emit(OpCode.CLASS, self._constant(stmt.name), len(stmt.methods))
+        self._define(stmt.name, stmt.slot)
+
+    def visit_expression_stmt(self, stmt: Expression) -> None:
+        self._expression(stmt.expression)
+        self._emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt: Function) -> None:
+        self._function(stmt, False)
+        self._define(stmt.name, stmt.slot)
+
+    def visit_if_stmt(self, stmt: If) -> None:
+        self._expression(stmt.condition)
+        to_else = self._emit(OpCode.POP_JUMP_IF_FALSE, 0)
+        stmt.then_branch.visit(self)
+        if stmt.else_branch is None:
+            self._patch(to_else, self._here())
+            return
+        to_end = self._emit(OpCode.JUMP, 0)
+        self._patch(to_else, self._here())
+        stmt.else_branch.visit(self)
+        self._patch(to_end, self._here())
+
+    def visit_print_stmt(self, stmt: Print) -> None:
+        self._expression(stmt.expression)
+        self._emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt: Return) -> None:
+        self._line = stmt.keyword.line
+        if stmt.value is None:
+            self._emit(OpCode.NIL)
+        else:
+            self._expression(stmt.value)
+        self._emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: Var) -> None:
+        if stmt.initializer is None:
+            self._emit(OpCode.NIL)
+        else:
+            self._expression(stmt.initializer)
+        self._define(stmt.name, stmt.slot)
+
+    def visit_while_stmt(self, stmt: While) -> None:
+        start = self._here()
+        self._expression(stmt.condition)
+        to_end = self._emit(OpCode.POP_JUMP_IF_FALSE, 0)
+        stmt.body.visit(self)
+        self._emit(OpCode.JUMP, start)
+        self._patch(to_end, self._here())
+
+    def visit_assign_expr(self, expr: Assign) -> None:
+        self._expression(expr.value)
+        self._line = expr.name.line
+        if expr.depth is None:
+            self._emit(OpCode.SET_GLOBAL, self._constant(expr.name))
+        else:
+            self._emit(OpCode.SET_LOCAL, expr.depth, expr.slot)
+
+    def visit_binary_expr(self, expr: Binary) -> None:
+        self._expression(expr.left)
+        self._expression(expr.right)
+        self._line = expr.operator.line
+        if expr.operator.token_type == BANG_EQUAL:
+            self._emit(OpCode.EQUAL)
+            self._emit(OpCode.NOT)
+        else:
+            self._emit(_BINARY_OPCODES[expr.operator.token_type])
+
+    def visit_call_expr(self, expr: Call) -> None:
+        self._expression(expr.callee)
+        for argument in expr.arguments:
+            self._expression(argument)
+        self._line = expr.paren.line
+        self._emit(OpCode.CALL, len(expr.arguments))
+
+    def visit_get_expr(self, expr: Get) -> None:
+        self._expression(expr.expr_object)
+        self._line = expr.name.line
+        self._emit(OpCode.GET_PROPERTY, self._constant(expr.name))
+
+    def visit_grouping_expr(self, expr: Grouping) -> None:
+        self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> None:
+        if expr.value is None:
+            self._emit(OpCode.NIL)
+        elif expr.value is True:
+            self._emit(OpCode.TRUE)
+        elif expr.value is False:
+            self._emit(OpCode.FALSE)
+        else:
+            self._emit(OpCode.CONSTANT, self._constant(expr.value))
+
+    def visit_logical_expr(self, expr: Logical) -> None:
+        self._expression(expr.left)
+        self._line = expr.operator.line
+        if expr.operator.token_type == OR:
+            to_end = self._emit(OpCode.JUMP_IF_TRUE, 0)
+        else:
+            to_end = self._emit(OpCode.JUMP_IF_FALSE, 0)
+        self._emit(OpCode.POP)
+        self._expression(expr.right)
+        self._patch(to_end, self._here())
+
+    def visit_set_expr(self, expr: Set) -> None:
+        self._expression(expr.expr_object)
+        self._expression(expr.value)
+        self._line = expr.name.line
+        self._emit(OpCode.SET_PROPERTY, self._constant(expr.name))
+
+    def visit_this_expr(self, expr: This) -> None:
+        self._line = expr.keyword.line
+        self._emit(OpCode.GET_LOCAL, expr.depth, expr.slot)
+
+    def visit_unary_expr(self, expr: Unary) -> None:
+        self._expression(expr.right)
+        self._line = expr.operator.line
+        if expr.operator.token_type == BANG:
+            self._emit(OpCode.NOT)
+        else:
+            self._emit(OpCode.NEGATE)
+
+    def visit_variable_expr(self, expr: Variable) -> None:
+        self._line = expr.name.line
+        if expr.depth is None:
+            self._emit(OpCode.GET_GLOBAL, self._constant(expr.name))
+        else:
+            self._emit(OpCode.GET_LOCAL, expr.depth, expr.slot)
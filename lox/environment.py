@@ -1,45 +1,51 @@
 from __future__ import annotations
 from attrs import define, Factory
-from typing import Optional, Self
 from .error import LoxRuntimeError
 from .token import Token
 
 
 @define
 class Environment:
-    # TODO: understand what is going on here on typesystem level https://stackoverflow.com/a/74586625
-    enclosing: Optional[Self] = None
-    _values: dict[str, object] = Factory(dict)
+    """A local scope whose variables are addressed by resolver-assigned slots."""
 
-    def get(self, name: Token) -> object:
-        if name.lexeme in self._values:
-            return self._values[name.lexeme]
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+    enclosing: Environment | GlobalEnvironment | None = None
+    values: list[object] = Factory(list)
 
-    def assign(self, name: Token, value: object) -> None:
-        if name.lexeme in self._values:
-            self._values[name.lexeme] = value
-            return
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
-
-    def define(self, name: str, value: object) -> None:
-        self._values[name] = value
+    def define(self, slot: int, value: object) -> None:
+        # the resolver hands out slots in declaration order, which has to be
+        # the order in which declarations are executed within a scope
+        assert slot == len(self.values), f"slot {slot} defined out of order"
+        self.values.append(value)
 
     def ancestor(self, distance: int) -> Environment:
         environment = self
         for _ in range(distance):
-            # TODO: is this somehow guaranteed? what if not?
-            if environment.enclosing is not None:
-                environment = environment.enclosing
+            environment = environment.enclosing
         return environment
 
-    def get_at(self, distance: int, name: str) -> object:
-        return self.ancestor(distance)._values[name]
+    def get_at(self, distance: int, slot: int) -> object:
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance: int, slot: int, value: object) -> None:
+        self.ancestor(distance).values[slot] = value
 
-    def assign_at(self, distance: int, name: Token, value: object) -> None:
-        self.ancestor(distance)._values[name.lexeme] = value
+
+@define
+class GlobalEnvironment:
+    """The outermost scope; globals are late bound and therefore looked up by name."""
+
+    values: dict[str, object] = Factory(dict)
+
+    def get(self, name: Token) -> object:
+        if name.lexeme in self.values:
+            return self.values[name.lexeme]
+        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+
+    def assign(self, name: Token, value: object) -> None:
+        if name.lexeme in self.values:
+            self.values[name.lexeme] = value
+            return
+        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+
+    def define(self, name: str, value: object) -> None:
+        self.values[name] = value
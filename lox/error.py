@@ -1,4 +1,5 @@
 import sys
+from typing import TextIO
 from attrs import define
 from .token import Token
 from .token_type import EOF
@@ -10,10 +11,38 @@ class LoxRuntimeError(RuntimeError):
     message: str
 
 
+@define
+class NativeError(Exception):
+    """An error in a native function, which doesn't know where it was called.
+
+    The call site turns it into a LoxRuntimeError at its own token.
+    """
+
+    message: str
+
+
+@define
+class ProgramError(Exception):
+    """Errors compiling or running a program through lox.compile.
+
+    message holds the diagnostics as run.py would print them.
+    """
+
+    message: str
+
+
 @define
 class ErrorHandler:
+    """The diagnostics of one run of a program.
+
+    The scanner, parser, resolver and interpreter that work on a program share
+    one, so programs run side by side in threads don't see each other's errors.
+    """
+
     had_error: bool = False
     had_runtime_error: bool = False
+    # where messages are printed; None is whatever sys.stderr is at the time
+    file: TextIO | None = None
 
     def error(self, line: int, message: str, where: str = ""):
         self.eprint(f"[line {line}] Error{where}: {message}")
@@ -31,12 +60,9 @@ class ErrorHandler:
         self.had_runtime_error = True
 
     def eprint(self, msg: str):
-        print(msg, file=sys.stderr)
+        print(msg, file=sys.stderr if self.file is None else self.file)
 
     def reset(self):
         self.had_error = False
         self.had_runtime_error = False
 
-
-# singleton for globally tracking whether error occurred
-error_handler = ErrorHandler()
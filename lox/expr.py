@@ -1,24 +1,30 @@
 from attrs import define
+from typing import Optional
 from .token import Token
 
 
-@define(frozen=True)
+# Nodes compare and hash by identity: the resolver annotates variable
+# accesses in place with the (depth, slot) of their binding, a depth of None
+# meaning the variable is global.
+@define(eq=False)
 class Expr:
     # TODO: make abstract method? How to define this interface?
     def visit(self, visitor):
         raise NotImplemented
 
 
-@define(frozen=True)
+@define(eq=False)
 class Assign(Expr):
     name: Token
     value: Expr
+    depth: Optional[int] = None
+    slot: int = 0
 
     def visit(self, visitor):
         return visitor.visit_assign_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Binary(Expr):
     left: Expr
     operator: Token
@@ -28,7 +34,7 @@ class Binary(Expr):
         return visitor.visit_binary_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Call(Expr):
     callee: Expr
     paren: Token
@@ -38,16 +44,19 @@ class Call(Expr):
         return visitor.visit_call_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Get(Expr):
     expr_object: Expr
     name: Token
+    # inline cache: the shape last seen here and what LoxInstance.lookup
+    # found for it
+    cache: Optional[tuple[object, object]] = None
 
     def visit(self, visitor):
         return visitor.visit_get_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Grouping(Expr):
     expression: Expr
 
@@ -55,7 +64,7 @@ class Grouping(Expr):
         return visitor.visit_grouping_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Literal(Expr):
     # TODO: refine this to what we'd expect (float, bool, str, None)
     value: object
@@ -64,7 +73,7 @@ class Literal(Expr):
         return visitor.visit_literal_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Logical(Expr):
     left: Expr
     operator: Token
@@ -74,7 +83,7 @@ class Logical(Expr):
         return visitor.visit_logical_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Set(Expr):
     expr_object: Expr
     name: Token
@@ -84,15 +93,17 @@ class Set(Expr):
         return visitor.visit_set_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class This(Expr):
     keyword: Token
+    depth: Optional[int] = None
+    slot: int = 0
 
     def visit(self, visitor):
         return visitor.visit_this_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Unary(Expr):
     operator: Token
     right: Expr
@@ -101,9 +112,11 @@ class Unary(Expr):
         return visitor.visit_unary_expr(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Variable(Expr):
     name: Token
+    depth: Optional[int] = None
+    slot: int = 0
 
     def visit(self, visitor):
         return visitor.visit_variable_expr(self)
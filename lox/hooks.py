@@ -0,0 +1,36 @@
+from __future__ import annotations
+from typing import Callable
+from attrs import define, Factory
+
+# Hooks let tools follow a program run by the tree-walking interpreter. They
+# are registered with Interpreter.add_hook, which turns the interpreter into a
+# HookedInterpreter; an interpreter without hooks never looks at them.
+
+EVENTS = ("statement", "enter", "exit", "instance", "error")
+
+
+@define
+class Hooks:
+    """Callbacks by event, called with:
+
+    statement(stmt)           before stmt is executed
+    enter(callee, arguments)  before a function, class or native is called;
+                              methods come bound to their instance
+    exit(callee, value)       after the call returned value
+    instance(instance)        after a class has created instance
+    error(error)              when a LoxRuntimeError stops the program
+
+    A call that ends in a runtime error does not get its exit event.
+    """
+
+    callbacks: dict[str, list[Callable]] = Factory(
+        lambda: {event: [] for event in EVENTS}
+    )
+
+    def add(self, event: str, callback: Callable) -> None:
+        if event not in self.callbacks:
+            raise ValueError(f"Unknown event '{event}'.")
+        self.callbacks[event].append(callback)
+
+    def remove(self, event: str, callback: Callable) -> None:
+        self.callbacks[event].remove(callback)
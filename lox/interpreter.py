@@ -1,62 +1,109 @@
 from __future__ import annotations
+import time
+from typing import Callable, TextIO
 from attrs import define, Factory
-from typing import TypeGuard, Callable
-from .callable import LoxCallable, LoxFunction, LoxClass, LoxInstance
-from .environment import Environment
-from .error import LoxRuntimeError, error_handler
+from .callable import (
+    LoxCallable,
+    LoxFunction,
+    LoxClass,
+    LoxInstance,
+    LRUCache,
+    MemoizedFunction,
+    TailCall,
+)
+from .environment import Environment, GlobalEnvironment
+from .error import ErrorHandler, LoxRuntimeError, NativeError
 from .expr import *
+from .hooks import Hooks
+from .natives import natives
+from .quickening import quicken
+from .rope import Rope, equal
 from .stmt import *
 from .token import Token
 from .token_type import *
 from .token_type import GREATER
 
 
-@define
-class Interpreter:
-    global_env: Environment = Factory(lambda: Environment())
-    _environment: Environment | None = None
-    _locals: dict[Expr, int] = Factory(dict)
+# What executing a statement returns: None when it completes normally, or a
+# 1-tuple holding the value of the `return` it executed.
+Completion = tuple[object] | None
 
-    @define
-    class RuntimeReturn(RuntimeError):
-        value: object
 
-    def __attrs_post_init__(self):
-        self._environment = self.global_env
+@define
+class Clock(LoxCallable):
+    def arity(self):
+        return 0
 
-    @classmethod
-    def with_time(cls) -> Interpreter:
-        import time
+    def call(self, interpreter, arguments):
+        # TODO: make this compatible with the base impl of Lox
+        return time.time()
 
-        interpreter = Interpreter()
+    def __str__(self):
+        return "<native fn>"
 
-        @define
-        class Clock(LoxCallable):
-            def arity(self):
-                return 0
 
-            def call(self, interpreter, arguments):
-                # TODO: make this compatible with the base impl of Lox
-                return time.time()
+@define
+class Interpreter:
+    global_env: GlobalEnvironment = Factory(GlobalEnvironment)
+    _environment: Environment | GlobalEnvironment | None = None
+    # see add_hook
+    hooks: Hooks = Factory(Hooks)
+    # when positive, pure functions remember this many results, kept in memos
+    memo_size: int = 0
+    memos: dict[Function, LRUCache] = Factory(dict)
+    # shared with the scanner, parser and resolver of the program, if given
+    error_handler: ErrorHandler = Factory(ErrorHandler)
+    # where print writes; None is whatever sys.stdout is at the time
+    stdout: TextIO | None = None
 
-            def __str__(self):
-                return "<native fn>"
+    def __attrs_post_init__(self):
+        self._environment = self.global_env
 
+    @classmethod
+    def with_time(cls, **fields) -> Interpreter:
+        interpreter = cls(**fields)
         interpreter.global_env.define("clock", Clock())
+        for name, native in natives().items():
+            interpreter.global_env.define(name, native)
         return interpreter
 
+    def add_hook(self, event: str, callback: Callable) -> None:
+        """Calls callback on event from now on, as described in lox.hooks.Hooks.
+
+        This turns the interpreter into a HookedInterpreter, which runs the
+        hooks, so that interpreters without hooks don't pay for them.
+        """
+        if type(self) is not Interpreter and type(self) is not HookedInterpreter:
+            raise TypeError(f"{type(self).__name__} does not run hooks.")
+        self.hooks.add(event, callback)
+        self.__class__ = HookedInterpreter
+
     def interpret(self, statements: list[Stmt]) -> None:
         try:
             for statement in statements:
                 self.execute(statement)
         except LoxRuntimeError as e:
-            error_handler.runtime_error(e)
+            self.error_handler.runtime_error(e)
 
-    def execute(self, stmt: Stmt):
-        return stmt.visit(self)
+    @classmethod
+    def prepare(cls, statements: list[Stmt]) -> object:
+        """Does the work of interpret that is the same for every run.
+
+        lox.compile keeps the result for run_prepared, so that running a
+        program again repeats none of it. The tree walker has none to do.
+        """
+        return statements
+
+    def run_prepared(self, prepared: object) -> None:
+        """Runs what prepare returned as interpret runs the statements."""
+        self.interpret(prepared)
 
-    def resolve(self, expr: Expr, depth: int):
-        self._locals[expr] = depth
+    def global_values(self) -> dict[str, object]:
+        """The global variables by name, natives included."""
+        return self.global_env.values
+
+    def execute(self, stmt: Stmt) -> Completion:
+        return stmt.visit(self)
 
     def evaluate(self, expr: Expr) -> str | float | bool | None:
         return expr.visit(self)
@@ -73,26 +120,30 @@ class Interpreter:
             return str(value).lower()
         return str(value)
 
-    def visit_block_stmt(self, stmt: Block) -> None:
+    def visit_block_stmt(self, stmt: Block) -> Completion:
         # TODO: gnah, mypy makes me go mad!
-        self.execute_block(stmt.statements, Environment(self._environment))
+        return self.execute_block(stmt.statements, Environment(self._environment))
 
     def visit_class_stmt(self, stmt: Class) -> None:
-        self._environment.define(stmt.name.lexeme, None)
         methods: dict[str, LoxFunction] = {}
         for method in stmt.methods:
             is_initializer = method.name.lexeme == "init"
             function = LoxFunction(method, self._environment, is_initializer)
             methods[method.name.lexeme] = function
         klass = LoxClass(stmt.name.lexeme, methods)
-        self._environment.assign(stmt.name, klass)
+        self._define(stmt.name, stmt.slot, klass)
 
-    def execute_block(self, statements: list[Stmt], environment: Environment) -> None:
+    def execute_block(
+        self, statements: list[Stmt], environment: Environment | GlobalEnvironment
+    ) -> Completion:
         previous = self._environment
         try:
             self._environment = environment
             for statement in statements:
-                self.execute(statement)
+                completion = self.execute(statement)
+                if completion is not None:
+                    return completion
+            return None
         finally:
             self._environment = previous
 
@@ -100,109 +151,152 @@ class Interpreter:
         self.evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        function = LoxFunction(stmt, self._environment, False)
-        self._environment.define(stmt.name.lexeme, function)
+        if stmt.pure and self.memo_size > 0:
+            # closures of a declaration share its cache: they compute the same
+            cache = self.memos.get(stmt)
+            if cache is None:
+                cache = self.memos[stmt] = LRUCache(self.memo_size)
+            function = MemoizedFunction(stmt, self._environment, False, cache)
+        else:
+            function = LoxFunction(stmt, self._environment, False)
+        self._define(stmt.name, stmt.slot, function)
 
-    def visit_if_stmt(self, stmt: If) -> None:
+    def visit_if_stmt(self, stmt: If) -> Completion:
         condition = self.evaluate(stmt.condition)
         if self.truthy(condition):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch is not None:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
+        return None
 
     def visit_print_stmt(self, stmt: Print) -> None:
         value = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        print(self.stringify(value), file=self.stdout)
 
-    def visit_return_stmt(self, stmt: Return) -> None:
+    def visit_return_stmt(self, stmt: Return) -> Completion:
         value = None
-        if stmt.value is not None:
+        if stmt.tail_call:
+            callee, this, arguments = self._evaluate_call(stmt.value)
+            if type(callee) is LoxFunction:
+                # leave the call to the loop in LoxFunction.call, which runs
+                # it in place of the function returning here
+                return (TailCall(callee, this, arguments),)
+            try:
+                if this is not None:
+                    value = callee.call_method(self, this, arguments)
+                else:
+                    value = callee.call(self, arguments)
+            except NativeError as e:
+                raise LoxRuntimeError(stmt.value.paren, e.message) from None
+        elif stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise self.RuntimeReturn(value)
+        return (value,)
 
     def visit_var_stmt(self, stmt: Var) -> None:
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self._environment.define(stmt.name.lexeme, value)
+        self._define(stmt.name, stmt.slot, value)
+
+    def _define(self, name: Token, slot: int | None, value: object) -> None:
+        if slot is None:
+            self.global_env.define(name.lexeme, value)
+        else:
+            self._environment.define(slot, value)
 
-    def visit_while_stmt(self, stmt: While) -> None:
+    def visit_while_stmt(self, stmt: While) -> Completion:
         while self.truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            completion = self.execute(stmt.body)
+            if completion is not None:
+                return completion
+        return None
 
     def visit_assign_expr(self, expr: Assign) -> object:
         value = self.evaluate(expr.value)
-        distance = self._locals.get(expr)
-        if distance is not None:
-            self._environment.assign_at(distance, expr.name, value)
+        if expr.depth is not None:
+            self._environment.assign_at(expr.depth, expr.slot, value)
         else:
             self.global_env.assign(expr.name, value)
         return value
 
     def visit_binary_expr(self, expr: Binary) -> object:
-        left = self.evaluate(expr.left)
-        right = self.evaluate(expr.right)
-
-        if expr.operator.token_type == TokenType.BANG_EQUAL:
-            return not self.is_equal(left, right)
-        if expr.operator.token_type == TokenType.EQUAL_EQUAL:
-            return self.is_equal(left, right)
-
-        operations: dict[TokenType, Callable[[float, float], float]] = {
-            TokenType.GREATER: (lambda a, b: a > b),
-            TokenType.GREATER_EQUAL: (lambda a, b: a >= b),
-            TokenType.LESS: (lambda a, b: a < b),
-            TokenType.LESS_EQUAL: (lambda a, b: a <= b),
-            TokenType.MINUS: (lambda a, b: a - b),
-            TokenType.PLUS: (lambda a, b: a + b),
-            TokenType.SLASH: (lambda a, b: a / b),
-            TokenType.STAR: (lambda a, b: a * b),
-        }
-        if expr.operator.token_type == TokenType.PLUS:
-            if isinstance(left, float) and isinstance(right, float):
-                return left + right
-            if isinstance(left, str) and isinstance(right, str):
-                return left + right
-            raise LoxRuntimeError(
-                expr.operator, "Operands must be two numbers or two strings."
-            )
-        if self.ensure_float([left, right], expr.operator):
-            return operations[expr.operator.token_type](left, right)
-        return None
+        if type(expr) is Binary:
+            quicken(expr)
+        return expr.evaluate(self)
 
     def visit_call_expr(self, expr: Call):
-        callee = self.evaluate(expr.callee)
-
-        arguments: list[object] = []
-        for argument in expr.arguments:
-            arguments.append(self.evaluate(argument))
-
-        if isinstance(callee, LoxCallable):
-            function = callee
-            if len(arguments) != function.arity():
-                raise LoxRuntimeError(
-                    expr.paren,
-                    f"Expected {function.arity()} arguments but got {len(arguments)}.",
-                )
-            return function.call(self, arguments)
+        callee, this, arguments = self._evaluate_call(expr)
+        try:
+            if this is not None:
+                return callee.call_method(self, this, arguments)
+            return callee.call(self, arguments)
+        except NativeError as e:
+            raise LoxRuntimeError(expr.paren, e.message) from None
+
+    def _evaluate_call(
+        self, expr: Call
+    ) -> tuple[LoxCallable, LoxInstance | None, list[object]]:
+        """Evaluates and checks callee and arguments of a call.
+
+        For `obj.name(...)` naming a method, the unbound method comes back
+        with obj as `this`, so it can be called without creating a bound
+        function.
+        """
+        this = None
+        if type(expr.callee) is Get:
+            get = expr.callee
+            obj = self.evaluate(get.expr_object)
+            if not isinstance(obj, LoxInstance):
+                raise LoxRuntimeError(get.name, "Only instances have properties.")
+            callee = self._lookup(get, obj)
+            if type(callee) is int:
+                callee = obj.values[callee]
+            else:
+                this = obj
         else:
+            callee = self.evaluate(expr.callee)
+
+        arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if not isinstance(callee, LoxCallable):
             raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+            )
+        return callee, this, arguments
+
+    def _lookup(self, get: Get, instance: LoxInstance) -> int | LoxFunction:
+        """LoxInstance.lookup through the inline cache of get."""
+        shape = instance.shape
+        cache = get.cache
+        if cache is not None and cache[0] is shape:
+            return cache[1]
+        found = instance.lookup(get.name)
+        get.cache = (shape, found)
+        return found
 
     def visit_get_expr(self, expr: Get):
         obj = self.evaluate(expr.expr_object)
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            found = self._lookup(expr, obj)
+            if type(found) is int:
+                return obj.values[found]
+            return found.bind(obj)
 
         raise LoxRuntimeError(expr.name, "Only instances have properties.")
 
     def is_equal(self, a, b):
+        if type(a) is Rope or type(b) is Rope:
+            return equal(a, b)
         if a is None and b is None:
             return True
         for t in [bool, float, str]:
             if isinstance(a, t) and isinstance(b, t):
                 return a == b
-        for t in [LoxInstance, LoxFunction, LoxClass]:
+        # functions, classes and natives like clock or Array alike
+        for t in [LoxInstance, LoxCallable]:
             if isinstance(a, t) and isinstance(b, t):
                 return a is b
         return False
@@ -234,26 +328,17 @@ class Interpreter:
         return value
 
     def visit_this_expr(self, expr: This) -> object:
-        return self._lookup_variable(expr.keyword, expr)
+        return self._environment.get_at(expr.depth, expr.slot)
 
     def visit_unary_expr(self, expr: Unary) -> object:
-        right = self.evaluate(expr.right)
-        match expr.operator.token_type:
-            case TokenType.BANG:
-                return not self.truthy(right)
-            case TokenType.MINUS:
-                if self.ensure_float([right], expr.operator):
-                    return -right
-        return None
+        if type(expr) is Unary:
+            quicken(expr)
+        return expr.evaluate(self)
 
     def visit_variable_expr(self, expr: Variable) -> object:
-        return self._lookup_variable(expr.name, expr)
-
-    def _lookup_variable(self, name: Token, expr: Expr) -> object:
-        distance = self._locals.get(expr)
-        if distance is not None and self._environment is not None:
-            return self._environment.get_at(distance, name.lexeme)
-        return self.global_env.get(name)
+        if expr.depth is not None:
+            return self._environment.get_at(expr.depth, expr.slot)
+        return self.global_env.get(expr.name)
 
     def truthy(self, o: object) -> bool:
         if o is None:
@@ -264,11 +349,51 @@ class Interpreter:
         # 0 and "" are truthy!
         return True
 
-    def ensure_float(
-        self, operands: list[object], operator: Token
-    ) -> TypeGuard[list[float]]:
-        if all(isinstance(op, float) for op in operands):
-            return True
-        label = "Operand" if len(operands) == 1 else "Operands"
-        expected = "a number" if len(operands) == 1 else "numbers"
-        raise LoxRuntimeError(operator, f"{label} must be {expected}.")
+
+@define
+class HookedInterpreter(Interpreter):
+    """Tree-walking interpreter that runs the hooks registered with it.
+
+    It adds no fields, so that a plain Interpreter can become one in place.
+    Calls in tail position are made as ordinary calls, so that every call
+    gets its enter and exit events.
+    """
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        try:
+            for statement in statements:
+                self.execute(statement)
+        except LoxRuntimeError as e:
+            for callback in self.hooks.callbacks["error"]:
+                callback(e)
+            self.error_handler.runtime_error(e)
+
+    def execute(self, stmt: Stmt) -> Completion:
+        for callback in self.hooks.callbacks["statement"]:
+            callback(stmt)
+        return stmt.visit(self)
+
+    def visit_return_stmt(self, stmt: Return) -> Completion:
+        if stmt.tail_call:
+            return (self.visit_call_expr(stmt.value),)
+        return super().visit_return_stmt(stmt)
+
+    def visit_call_expr(self, expr: Call):
+        callee, this, arguments = self._evaluate_call(expr)
+        callbacks = self.hooks.callbacks
+        function = callee if this is None else callee.bind(this)
+        for callback in callbacks["enter"]:
+            callback(function, arguments)
+        try:
+            if this is not None:
+                value = callee.call_method(self, this, arguments)
+            else:
+                value = callee.call(self, arguments)
+        except NativeError as e:
+            raise LoxRuntimeError(expr.paren, e.message) from None
+        if isinstance(callee, LoxClass):
+            for callback in callbacks["instance"]:
+                callback(value)
+        for callback in callbacks["exit"]:
+            callback(function, value)
+        return value
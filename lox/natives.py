@@ -0,0 +1,204 @@
+from __future__ import annotations
+from array import array
+from typing import Callable
+from attrs import define, field, Factory
+from .callable import LoxCallable, LoxInstance, Shape
+from .error import NativeError
+from .rope import Rope
+
+# Array and Map, collections implemented in Python. Their instances are
+# LoxInstances whose class is a NativeClass of NativeMethods, so every engine
+# gets and calls their methods the way it does those of Lox classes:
+#
+#   var a = Array();  a.push(x); a.pop(); a.get(i); a.set(i, x); a.length();
+#   var m = Map();    m.set(k, x); m.get(k); m.has(k); m.remove(k); m.size();
+#                     m.keys();
+#
+# Indexes are whole numbers from 0. Map keys compare like `==`: numbers and
+# strings by value, instances, functions and classes by identity. Vector, for
+# bulk arithmetic on numbers, is in lox.vector.
+
+
+@define
+class NativeMethod(LoxCallable):
+    name: str
+    _arity: int
+    # called with the instance, then the interpreter if takes_interpreter is
+    # set, then the arguments
+    function: Callable
+    takes_interpreter: bool = False
+
+    def arity(self) -> int:
+        return self._arity
+
+    def call_method(
+        self, interpreter, instance: LoxInstance, arguments: list[object]
+    ) -> object:
+        if self.takes_interpreter:
+            return self.function(instance, interpreter, *arguments)
+        return self.function(instance, *arguments)
+
+    def bind(self, instance: LoxInstance) -> BoundNativeMethod:
+        return BoundNativeMethod(self, instance)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+@define
+class BoundNativeMethod(LoxCallable):
+    method: NativeMethod
+    instance: LoxInstance
+
+    def arity(self) -> int:
+        return self.method.arity()
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        return self.method.call_method(interpreter, self.instance, arguments)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+@define(eq=False)
+class NativeClass(LoxCallable):
+    """A class implemented in Python, standing in for a LoxClass in shapes."""
+
+    name: str
+    instance_type: type[LoxInstance]
+    methods: dict[str, NativeMethod]
+    # called on new instances with the arguments of the class
+    initializer: NativeMethod | None = None
+    shape: Shape = field(
+        default=Factory(lambda self: Shape(self), takes_self=True), repr=False
+    )
+
+    def arity(self) -> int:
+        if self.initializer is None:
+            return 0
+        return self.initializer.arity()
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        instance = self.instance_type(self.shape)
+        if self.initializer is not None:
+            self.initializer.call_method(interpreter, instance, arguments)
+        return instance
+
+    def find_method(self, name: str) -> NativeMethod | None:
+        return self.methods.get(name)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+@define(eq=False)
+class LoxArray(LoxInstance):
+    # numbers are kept unboxed until something else is stored
+    items: array | list = Factory(lambda: array("d"))
+
+    def push(self, value: object) -> None:
+        self._allow(value)
+        self.items.append(value)
+
+    def pop(self) -> object:
+        if not self.items:
+            raise NativeError("Can't pop from an empty array.")
+        return self.items.pop()
+
+    def get_item(self, index: object) -> object:
+        return self.items[self._index(index)]
+
+    def set_item(self, index: object, value: object) -> object:
+        index = self._index(index)
+        self._allow(value)
+        self.items[index] = value
+        return value
+
+    def length(self) -> float:
+        return float(len(self.items))
+
+    def _allow(self, value: object) -> None:
+        if type(value) is not float and type(self.items) is array:
+            self.items = list(self.items)
+
+    def _index(self, index: object) -> int:
+        if type(index) is not float or not index.is_integer():
+            raise NativeError("Index must be a whole number.")
+        if not 0 <= index < len(self.items):
+            raise NativeError("Index out of range.")
+        return int(index)
+
+
+def _key(value: object) -> tuple:
+    """What a Map looks value up by, following Interpreter.is_equal."""
+    kind = type(value)
+    if kind is Rope:
+        return (str, str(value))
+    if kind is float or kind is str or kind is bool or value is None:
+        # with the type, as Python has 1.0 == True
+        return (kind, value)
+    return (object, id(value))
+
+
+@define(eq=False)
+class LoxMap(LoxInstance):
+    # (key, value) by _key(key), which keeps the objects identified by id alive
+    entries: dict[tuple, tuple[object, object]] = Factory(dict)
+
+    def get_value(self, key: object) -> object:
+        entry = self.entries.get(_key(key))
+        return None if entry is None else entry[1]
+
+    def set_value(self, key: object, value: object) -> object:
+        self.entries[_key(key)] = (key, value)
+        return value
+
+    def has(self, key: object) -> bool:
+        return _key(key) in self.entries
+
+    def remove(self, key: object) -> object:
+        entry = self.entries.pop(_key(key), None)
+        return None if entry is None else entry[1]
+
+    def size(self) -> float:
+        return float(len(self.entries))
+
+
+def natives() -> dict[str, LoxCallable]:
+    """Fresh native classes by global name, for one interpreter."""
+    from .vector import vector_class
+
+    array_class = NativeClass(
+        "Array",
+        LoxArray,
+        {
+            "push": NativeMethod("push", 1, LoxArray.push),
+            "pop": NativeMethod("pop", 0, LoxArray.pop),
+            "get": NativeMethod("get", 1, LoxArray.get_item),
+            "set": NativeMethod("set", 2, LoxArray.set_item),
+            "length": NativeMethod("length", 0, LoxArray.length),
+        },
+    )
+
+    def keys(instance: LoxMap) -> LoxArray:
+        keys = LoxArray(array_class.shape)
+        keys.items = [key for key, _ in instance.entries.values()]
+        return keys
+
+    map_class = NativeClass(
+        "Map",
+        LoxMap,
+        {
+            "get": NativeMethod("get", 1, LoxMap.get_value),
+            "set": NativeMethod("set", 2, LoxMap.set_value),
+            "has": NativeMethod("has", 1, LoxMap.has),
+            "remove": NativeMethod("remove", 1, LoxMap.remove),
+            "size": NativeMethod("size", 0, LoxMap.size),
+            "keys": NativeMethod("keys", 0, keys),
+        },
+    )
+    return {
+        "Array": array_class,
+        "Map": map_class,
+        "Vector": vector_class(array_class),
+    }
@@ -0,0 +1,246 @@
+from __future__ import annotations
+import attrs
+import operator
+from attrs import define, Factory
+from typing import Callable
+from .error import ErrorHandler
+from .expr import *
+from .resolver import Resolver
+from .stmt import *
+from .token_type import *
+
+# A pass rewrites a program and returns the rewritten statements.
+Pass = Callable[[list[Stmt]], list[Stmt]]
+
+_NUMERIC_OPERATIONS: dict[TokenType, Callable[[float, float], object]] = {
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+}
+
+
+def _truthy(value: object) -> bool:
+    return value is not None and value is not False
+
+
+def _is_equal(a: object, b: object) -> bool:
+    # Interpreter.is_equal restricted to the values a literal can hold
+    return type(a) is type(b) and a == b
+
+
+def _names(node: Expr | Stmt) -> set[str]:
+    """Names of all variables read or assigned anywhere below node."""
+    names = set()
+    if isinstance(node, (Variable, Assign)):
+        names.add(node.name.lexeme)
+    for field in attrs.fields(type(node)):
+        value = getattr(node, field.name)
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, (Expr, Stmt)):
+                names |= _names(child)
+    return names
+
+
+@define
+class Optimizer:
+    """Simplifies a resolved program without changing what it does.
+
+    Expressions over literals are folded into literals, groupings disappear,
+    if statements with a constant condition are replaced by the branch taken,
+    statements following a return are dropped, and the block the parser wraps
+    around a for loop body and its increment is merged with the body.
+    """
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        optimized = []
+        for statement in statements:
+            statement = self._statement(statement)
+            if statement is None:
+                continue
+            optimized.append(statement)
+            if isinstance(statement, Return):
+                break
+        return optimized
+
+    def _statement(self, stmt: Stmt) -> Stmt | None:
+        """Returns the simplified statement, or None if it does nothing."""
+        return stmt.visit(self)
+
+    def _branch(self, stmt: Stmt) -> Stmt:
+        # where the grammar requires a statement, an empty block does nothing
+        optimized = self._statement(stmt)
+        return Block([]) if optimized is None else optimized
+
+    def _expression(self, expr: Expr) -> Expr:
+        return expr.visit(self)
+
+    def visit_block_stmt(self, stmt: Block) -> Stmt | None:
+        stmt.statements = self.optimize(stmt.statements)
+        statements = stmt.statements
+        if (
+            len(statements) == 2
+            and isinstance(statements[0], Block)
+            and isinstance(statements[1], Expression)
+        ):
+            # `for` desugars to Block([body, Expression(increment)]); merging
+            # the two saves an environment per iteration as long as nothing
+            # declared in the body shadows a name the increment uses
+            body, increment = statements
+            declared = {
+                s.name.lexeme
+                for s in body.statements
+                if isinstance(s, (Var, Function, Class))
+            }
+            if not declared & _names(increment.expression):
+                stmt.statements = body.statements + [increment]
+        return stmt
+
+    def visit_class_stmt(self, stmt: Class) -> Stmt:
+        for method in stmt.methods:
+            method.body = self.optimize(method.body)
+        return stmt
+
+    def visit_expression_stmt(self, stmt: Expression) -> Stmt:
+        stmt.expression = self._expression(stmt.expression)
+        return stmt
+
+    def visit_function_stmt(self, stmt: Function) -> Stmt:
+        stmt.body = self.optimize(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt: If) -> Stmt | None:
+        stmt.condition = self._expression(stmt.condition)
+        if isinstance(stmt.condition, Literal):
+            if _truthy(stmt.condition.value):
+                return self._statement(stmt.then_branch)
+            if stmt.else_branch is None:
+                return None
+            return self._statement(stmt.else_branch)
+        stmt.then_branch = self._branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self._statement(stmt.else_branch)
+        return stmt
+
+    def visit_print_stmt(self, stmt: Print) -> Stmt:
+        stmt.expression = self._expression(stmt.expression)
+        return stmt
+
+    def visit_return_stmt(self, stmt: Return) -> Stmt:
+        if stmt.value is not None:
+            stmt.value = self._expression(stmt.value)
+        return stmt
+
+    def visit_var_stmt(self, stmt: Var) -> Stmt:
+        if stmt.initializer is not None:
+            stmt.initializer = self._expression(stmt.initializer)
+        return stmt
+
+    def visit_while_stmt(self, stmt: While) -> Stmt:
+        stmt.condition = self._expression(stmt.condition)
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    def visit_assign_expr(self, expr: Assign) -> Expr:
+        expr.value = self._expression(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: Binary) -> Expr:
+        expr.left = self._expression(expr.left)
+        expr.right = self._expression(expr.right)
+        if not isinstance(expr.left, Literal) or not isinstance(expr.right, Literal):
+            return expr
+
+        # anything that would fail at runtime is left for the runtime to report
+        a, b = expr.left.value, expr.right.value
+        match expr.operator.token_type:
+            case TokenType.EQUAL_EQUAL:
+                return Literal(_is_equal(a, b))
+            case TokenType.BANG_EQUAL:
+                return Literal(not _is_equal(a, b))
+            case TokenType.PLUS:
+                if type(a) is type(b) and type(a) in (float, str):
+                    return Literal(a + b)
+                return expr
+        if type(a) is not float or type(b) is not float:
+            return expr
+        if expr.operator.token_type == SLASH and b == 0:
+            return expr
+        return Literal(_NUMERIC_OPERATIONS[expr.operator.token_type](a, b))
+
+    def visit_call_expr(self, expr: Call) -> Expr:
+        expr.callee = self._expression(expr.callee)
+        expr.arguments = [self._expression(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: Get) -> Expr:
+        expr.expr_object = self._expression(expr.expr_object)
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping) -> Expr:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: Logical) -> Expr:
+        expr.left = self._expression(expr.left)
+        expr.right = self._expression(expr.right)
+        if not isinstance(expr.left, Literal):
+            return expr
+        # `or` yields a truthy left operand, `and` a falsey one
+        if _truthy(expr.left.value) == (expr.operator.token_type == OR):
+            return expr.left
+        return expr.right
+
+    def visit_set_expr(self, expr: Set) -> Expr:
+        expr.expr_object = self._expression(expr.expr_object)
+        expr.value = self._expression(expr.value)
+        return expr
+
+    def visit_this_expr(self, expr: This) -> Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: Unary) -> Expr:
+        expr.right = self._expression(expr.right)
+        if not isinstance(expr.right, Literal):
+            return expr
+        value = expr.right.value
+        if expr.operator.token_type == BANG:
+            return Literal(not _truthy(value))
+        if type(value) is float:
+            return Literal(-value)
+        return expr
+
+    def visit_variable_expr(self, expr: Variable) -> Expr:
+        return expr
+
+
+@define
+class Pipeline:
+    """Runs a sequence of passes over a resolved program.
+
+    Passes may restructure scopes, so the result is resolved again before it
+    is handed to an interpreter.
+    """
+
+    passes: list[Pass] = Factory(list)
+
+    @classmethod
+    def for_level(cls, level: int) -> Pipeline:
+        if level == 0:
+            return cls()
+        return cls([lambda statements: Optimizer().optimize(statements)])
+
+    def run(self, statements: list[Stmt], error_handler: ErrorHandler) -> list[Stmt]:
+        """Runs the passes, resolving the result for the run of error_handler."""
+        if not self.passes:
+            return statements
+        for optimization in self.passes:
+            statements = optimization(statements)
+        Resolver(error_handler).resolve(statements)
+        return statements
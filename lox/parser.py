@@ -1,5 +1,6 @@
-from attrs import define, Factory
-from typing import List, Optional
+from attrs import define, field, Factory
+from typing import Iterable, Iterator, Optional
+from .error import ErrorHandler
 from .expr import *
 from .stmt import *
 from .token import Token
@@ -8,17 +9,28 @@ from .token_type import *
 
 @define
 class Parser:
-    tokens: List[Token] = Factory(list)
-    _current: int = 0
+    # any iterable ending in EOF, e.g. Scanner.iter_tokens() to parse while
+    # scanning; the parser only keeps the current and the previous token
+    tokens: Iterable[Token] = Factory(list)
+    error_handler: ErrorHandler = Factory(ErrorHandler)
+    _stream: Iterator[Token] = field(init=False)
+    _next: Token = field(init=False)
+    _last: Token | None = field(init=False, default=None)
 
     class ParseError(RuntimeError):
         pass
 
+    def __attrs_post_init__(self) -> None:
+        self._stream = iter(self.tokens)
+        self._next = next(self._stream, Token(EOF, "", None, 1))
+
     def parse(self) -> list[Optional[Stmt]]:
-        statements = []
+        return list(self.declarations())
+
+    def declarations(self) -> Iterator[Optional[Stmt]]:
+        """Yields top-level declarations as soon as each one is parsed."""
         while not self._at_end():
-            statements.append(self._declaration())
-        return statements
+            yield self._declaration()
 
     def _declaration(self) -> Optional[Stmt]:
         try:
@@ -296,9 +308,7 @@ class Parser:
         raise self._error(self._peek(), message)
 
     def _error(self, token: Token, message: str) -> ParseError:
-        from .error import error_handler
-
-        error_handler.token_error(token, message)
+        self.error_handler.token_error(token, message)
         return self.ParseError()
 
     def _synchronize(self) -> None:
@@ -327,17 +337,18 @@ class Parser:
 
     def _advance(self) -> Token:
         if not self._at_end():
-            self._current += 1
+            self._last = self._next
+            self._next = next(self._stream)
         return self._previous()
 
     def _at_end(self) -> bool:
         return self._peek().token_type == EOF
 
     def _peek(self) -> Token:
-        return self.tokens[self._current]
+        return self._next
 
     def _previous(self) -> Token:
         assert (
-            self._current > 0
+            self._last is not None
         ), "[parser] can't access previous token without advancing"
-        return self.tokens[self._current - 1]
+        return self._last
@@ -0,0 +1,276 @@
+from __future__ import annotations
+import sys
+import threading
+import time
+from typing import TextIO
+from attrs import define, Factory
+from .callable import LoxCallable, LoxClass, LoxFunction
+from .error import LoxRuntimeError, NativeError
+from .interpreter import Interpreter, Completion
+from .natives import BoundNativeMethod, NativeMethod
+from .expr import Call, Expr
+from .stmt import Return, Stmt
+from .token import Token
+
+# Profiling of Lox programs run by the tree-walking interpreter.
+#
+# Deterministic: ProfilingInterpreter times every call of a LoxFunction,
+# LoxClass or native made by the program and hands it to a Profiler, which
+# keeps per-function totals, call-graph edges and the time spent in each
+# distinct call stack. The plain Interpreter is left untouched, so there is
+# no cost when profiling is off.
+#
+# Statistical: a Sampler looks at the Python stack of the interpreting thread
+# from a background thread every few milliseconds and counts the Lox line and
+# call stack it finds there, which leaves the program running at close to
+# full speed.
+
+SCRIPT = "<script>"
+
+
+@define
+class FunctionStats:
+    calls: int = 0
+    # nanoseconds, inclusive only counting the outermost of recursive calls
+    inclusive: int = 0
+    exclusive: int = 0
+
+
+@define
+class _Frame:
+    label: str
+    # (parent path, label), or None above the root
+    path: tuple | None
+    start: int
+    children: int = 0
+
+
+@define
+class Profiler:
+    stats: dict[str, FunctionStats] = Factory(dict)
+    edges: dict[tuple[str, str], int] = Factory(dict)
+    # exclusive nanoseconds per call stack, keyed by nested (parent, label)
+    stacks: dict[tuple, int] = Factory(dict)
+    _frames: list[_Frame] = Factory(list)
+    _active: dict[str, int] = Factory(dict)
+
+    def enter(self, label: str) -> None:
+        parent = self._frames[-1].path if self._frames else None
+        if self._frames:
+            edge = (self._frames[-1].label, label)
+            self.edges[edge] = self.edges.get(edge, 0) + 1
+        self._active[label] = self._active.get(label, 0) + 1
+        self._frames.append(_Frame(label, (parent, label), time.perf_counter_ns()))
+
+    def exit(self) -> None:
+        now = time.perf_counter_ns()
+        frame = self._frames.pop()
+        elapsed = now - frame.start
+        stats = self.stats.get(frame.label)
+        if stats is None:
+            stats = self.stats[frame.label] = FunctionStats()
+        stats.calls += 1
+        stats.exclusive += elapsed - frame.children
+        self._active[frame.label] -= 1
+        if not self._active[frame.label]:
+            stats.inclusive += elapsed
+        self.stacks[frame.path] = (
+            self.stacks.get(frame.path, 0) + elapsed - frame.children
+        )
+        if self._frames:
+            self._frames[-1].children += elapsed
+
+    def report(self, file: TextIO) -> None:
+        """Writes per-function totals by exclusive time, then the call graph."""
+        print(f"{'calls':>8} {'total ms':>10} {'self ms':>10}  function", file=file)
+        ranked = sorted(self.stats.items(), key=lambda item: -item[1].exclusive)
+        for label, stats in ranked:
+            print(
+                f"{stats.calls:>8} {stats.inclusive / 1e6:>10.3f}"
+                f" {stats.exclusive / 1e6:>10.3f}  {label}",
+                file=file,
+            )
+        print("\ncall graph:", file=file)
+        for (caller, callee), calls in sorted(
+            self.edges.items(), key=lambda item: -item[1]
+        ):
+            print(f"{calls:>8}  {caller} -> {callee}", file=file)
+
+    def write_collapsed(self, file: TextIO) -> None:
+        """Writes `caller;callee microseconds` lines as used by flamegraph.pl."""
+        for path, nanoseconds in self.stacks.items():
+            labels = []
+            while path is not None:
+                path, label = path
+                labels.append(label)
+            microseconds = nanoseconds // 1000
+            if microseconds:
+                print(f"{';'.join(reversed(labels))} {microseconds}", file=file)
+
+
+@define
+class ProfilingInterpreter(Interpreter):
+    """Tree-walking interpreter that reports every call to its profiler.
+
+    Calls in tail position are made as ordinary calls, so each of them shows
+    up in the profile, at the cost of Python stack for deep tail recursion.
+    """
+
+    profiler: Profiler = Factory(Profiler)
+    _labels: dict[int, str] = Factory(dict)
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        self.profiler.enter(SCRIPT)
+        try:
+            super().interpret(statements)
+        finally:
+            self.profiler.exit()
+
+    def visit_return_stmt(self, stmt: Return) -> Completion:
+        if stmt.tail_call:
+            return (self.visit_call_expr(stmt.value),)
+        return super().visit_return_stmt(stmt)
+
+    def visit_call_expr(self, expr: Call):
+        callee, this, arguments = self._evaluate_call(expr)
+        profiler = self.profiler
+        profiler.enter(self._label(callee, this))
+        try:
+            if this is not None:
+                return callee.call_method(self, this, arguments)
+            return callee.call(self, arguments)
+        except NativeError as e:
+            raise LoxRuntimeError(expr.paren, e.message) from None
+        finally:
+            profiler.exit()
+
+    def _label(self, callee: LoxCallable, this) -> str:
+        if isinstance(callee, LoxFunction):
+            name = callee.declaration.name
+            if this is not None:
+                return f"{this.klass.name}.{name.lexeme}:{name.line}"
+            return f"{name.lexeme}:{name.line}"
+        if type(callee) is NativeMethod:
+            return f"{this.klass.name}.{callee.name}"
+        if type(callee) is BoundNativeMethod:
+            return f"{callee.instance.klass.name}.{callee.method.name}"
+        label = self._labels.get(id(callee))
+        if label is None:
+            label = type(callee).__name__
+            if isinstance(callee, LoxClass):
+                label = callee.name
+            else:
+                # natives are only known by the global they are bound to
+                for name, value in self.global_env.values.items():
+                    if value is callee:
+                        label = name
+            self._labels[id(callee)] = label
+        return label
+
+
+def first_line(node: object) -> int | None:
+    """Line of the first token in node, searching its fields depth first."""
+    if isinstance(node, Token):
+        return node.line
+    if isinstance(node, list):
+        children = node
+    elif isinstance(node, (Expr, Stmt)):
+        children = [getattr(node, a.name) for a in type(node).__attrs_attrs__]
+    else:
+        return None
+    for child in children:
+        line = first_line(child)
+        if line is not None:
+            return line
+    return None
+
+
+_EXECUTE = Interpreter.execute.__code__
+_FUNCTION = LoxFunction._execute.__code__
+_CLASS = LoxClass.call.__code__
+
+
+@define
+class Sampler:
+    """Samples the Lox line and call stack a thread is running.
+
+    Samples are taken on a background thread, which only gets to run when
+    the interpreting thread gives up the GIL, so intervals below
+    sys.getswitchinterval() (5 ms by default) are not honoured.
+    """
+
+    interval: float = 0.005
+    samples: int = 0
+    lines: dict[int, int] = Factory(dict)
+    # samples per call stack, outermost first, ending with the line
+    stacks: dict[tuple[str, ...], int] = Factory(dict)
+    _target: int | None = None
+    _thread: threading.Thread | None = None
+    _stopped: threading.Event = Factory(threading.Event)
+    _statement_lines: dict[int, int | None] = Factory(dict)
+
+    def start(self) -> None:
+        """Starts sampling the calling thread."""
+        self._target = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.sample(frame)
+
+    def sample(self, frame) -> None:
+        line = None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is _EXECUTE and line is None:
+                line = self._line(frame.f_locals["stmt"])
+            elif code is _FUNCTION:
+                name = frame.f_locals["function"].declaration.name
+                stack.append(f"{name.lexeme}:{name.line}")
+            elif code is _CLASS:
+                stack.append(frame.f_locals["self"].name)
+            frame = frame.f_back
+        if line is None:
+            # not running Lox code right now
+            return
+        self.samples += 1
+        self.lines[line] = self.lines.get(line, 0) + 1
+        stack.append(SCRIPT)
+        key = (*reversed(stack), f"line {line}")
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def _line(self, stmt: Stmt) -> int | None:
+        line = self._statement_lines.get(id(stmt), -1)
+        if line == -1:
+            line = self._statement_lines[id(stmt)] = first_line(stmt)
+        return line
+
+    def report(self, file: TextIO, limit: int = 10) -> None:
+        """Writes the share of samples of the hottest lines and stacks."""
+        print(f"{self.samples} samples", file=file)
+        if not self.samples:
+            return
+        print("\nhottest lines:", file=file)
+        for line, count in self._hottest(self.lines, limit):
+            print(f"{count / self.samples:>8.1%}  line {line}", file=file)
+        print("\nhottest stacks:", file=file)
+        for stack, count in self._hottest(self.stacks, limit):
+            print(f"{count / self.samples:>8.1%}  {';'.join(stack)}", file=file)
+
+    def write_collapsed(self, file: TextIO) -> None:
+        """Writes `caller;callee;line samples` lines as used by flamegraph.pl."""
+        for stack, count in self.stacks.items():
+            print(f"{';'.join(stack)} {count}", file=file)
+
+    @staticmethod
+    def _hottest(counts: dict, limit: int) -> list:
+        return sorted(counts.items(), key=lambda item: -item[1])[:limit]
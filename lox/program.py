@@ -0,0 +1,160 @@
+from __future__ import annotations
+import inspect
+import io
+from typing import Callable, TextIO
+from attrs import define, field, Factory
+from .callable import LoxCallable, LoxInstance
+from .error import ErrorHandler, ProgramError
+from .interpreter import Interpreter
+from .natives import LoxArray, LoxMap
+from .optimizer import Pipeline
+from .parser import Parser
+from .resolver import Resolver
+from .rope import Rope
+from .scanner import Scanner
+from .stmt import Stmt
+from .vector import LoxVector
+
+# Embedding Lox: compile a program once, then run it as often as needed, from
+# as many threads as needed, each run on fresh globals:
+#
+#   program = lox.compile("var total = price * count;")
+#   program.run({"price": 2.5, "count": 4})["total"]  # 10.0
+#
+# Values going in are converted to Lox: ints become numbers, lists and tuples
+# Arrays, dicts Maps and other callables native functions. Values coming out
+# are converted back: Arrays and Vectors become lists, Maps dicts and long
+# strings str. Numbers, strings, booleans, nil, instances and Lox functions
+# and classes are passed as they are.
+
+_POSITIONAL = (
+    inspect.Parameter.POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+)
+
+
+@define(frozen=True)
+class Program:
+    """A scanned, parsed, resolved and optimised program, made by compile.
+
+    The statements are also compiled for the engine once, to closures, byte
+    code or Python code, and runs only build their globals. Runs share the
+    statements and what they compiled to. Interpreters only change them in
+    ways that can't change what a run does: quickening swaps the classes of
+    operator nodes, and property accesses remember their last lookup per
+    shape.
+    """
+
+    statements: tuple[Stmt, ...]
+    engine: type[Interpreter] = Interpreter
+    # what engine.prepare made of the statements
+    prepared: object = field(
+        default=Factory(
+            lambda self: self.engine.prepare(list(self.statements)), takes_self=True
+        ),
+        repr=False,
+    )
+
+    def run(
+        self, globals: dict[str, object] | None = None, stdout: TextIO | None = None
+    ) -> dict[str, object]:
+        """Runs the program with globals defined, printing to stdout.
+
+        Returns the globals after the run, natives left out, as Python values.
+        Raises a ProgramError if the program fails.
+        """
+        error_handler = ErrorHandler(file=io.StringIO())
+        interpreter = self.engine.with_time(error_handler=error_handler, stdout=stdout)
+        natives = dict(interpreter.global_values())
+        for name, value in (globals or {}).items():
+            interpreter.global_env.define(name, to_lox(value, natives))
+        interpreter.run_prepared(self.prepared)
+        if error_handler.had_runtime_error:
+            raise ProgramError(error_handler.file.getvalue())
+        return {
+            name: to_python(value)
+            for name, value in interpreter.global_values().items()
+            if natives.get(name) is not value
+        }
+
+
+def compile(
+    source: str, optimize: int = 1, engine: type[Interpreter] = Interpreter
+) -> Program:
+    """Compiles source to run on engine; raises a ProgramError on errors."""
+    error_handler = ErrorHandler(file=io.StringIO())
+    scanner = Scanner(source, error_handler=error_handler)
+    statements = Parser(scanner.iter_tokens(), error_handler).parse()
+    if not error_handler.had_error:
+        Resolver(error_handler).resolve(statements)
+    if error_handler.had_error:
+        raise ProgramError(error_handler.file.getvalue())
+    statements = Pipeline.for_level(optimize).run(statements, error_handler)
+    return Program(tuple(statements), engine)
+
+
+@define
+class PythonFunction(LoxCallable):
+    """A Python callable passed to a program, called with Python values."""
+
+    function: Callable
+    _arity: int
+    # the natives of the run, to convert results with
+    natives: dict[str, object]
+
+    def arity(self) -> int:
+        return self._arity
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        result = self.function(*map(to_python, arguments))
+        return to_lox(result, self.natives)
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+def to_lox(value: object, natives: dict[str, object]) -> object:
+    """The Lox value for value, given the natives of the run it is for."""
+    if value is None or type(value) is bool:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, (LoxCallable, LoxInstance)):
+        return value
+    if isinstance(value, (list, tuple)):
+        array = LoxArray(natives["Array"].shape)
+        for item in value:
+            array.push(to_lox(item, natives))
+        return array
+    if isinstance(value, dict):
+        lox_map = LoxMap(natives["Map"].shape)
+        for key, item in value.items():
+            lox_map.set_value(to_lox(key, natives), to_lox(item, natives))
+        return lox_map
+    if callable(value):
+        parameters = inspect.signature(value).parameters.values()
+        arity = sum(
+            p.kind in _POSITIONAL and p.default is inspect.Parameter.empty
+            for p in parameters
+        )
+        return PythonFunction(value, arity, natives)
+    raise TypeError(f"Lox has no values of type {type(value).__name__}")
+
+
+def to_python(value: object) -> object:
+    """The Python value for a Lox value."""
+    if type(value) is Rope:
+        return str(value)
+    if isinstance(value, LoxArray):
+        return [to_python(item) for item in value.items]
+    if isinstance(value, LoxVector):
+        return [float(x) for x in value.data]
+    if isinstance(value, LoxMap):
+        # keys stay hashable: only long strings need converting
+        return {
+            str(key) if type(key) is Rope else key: to_python(item)
+            for key, item in value.entries.values()
+        }
+    return value
@@ -0,0 +1,195 @@
+from __future__ import annotations
+from attrs import define
+from .error import LoxRuntimeError
+from .expr import Binary, Unary
+from .rope import Rope, concat
+from .token_type import *
+
+# Operator-specialised Binary and Unary nodes for the tree-walking
+# interpreter. The first evaluation of a node swaps its class for the one of
+# its operator (see quicken), and `+` narrows itself further to numbers or
+# strings once it has seen its operands. The classes add no fields and keep
+# visiting as Binary or Unary, so every other visitor still sees the node it
+# expects.
+
+
+def _numbers_error(operator) -> LoxRuntimeError:
+    return LoxRuntimeError(operator, "Operands must be numbers.")
+
+
+@define(eq=False)
+class Add(Binary):
+    """`+` that has not seen its operands yet."""
+
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            self.__class__ = NumericAdd
+        elif (type(a) is str or type(a) is Rope) and (
+            type(b) is str or type(b) is Rope
+        ):
+            self.__class__ = StringAdd
+        else:
+            self.__class__ = GenericAdd
+        return GenericAdd.add(self, a, b)
+
+
+@define(eq=False)
+class GenericAdd(Binary):
+    """`+` that has seen numbers as well as strings."""
+
+    def evaluate(self, interpreter) -> object:
+        return self.add(self.left.visit(interpreter), self.right.visit(interpreter))
+
+    def add(self, a: object, b: object) -> object:
+        if type(a) is float and type(b) is float:
+            return a + b
+        if (type(a) is str or type(a) is Rope) and (type(b) is str or type(b) is Rope):
+            return concat(a, b)
+        raise LoxRuntimeError(
+            self.operator, "Operands must be two numbers or two strings."
+        )
+
+
+@define(eq=False)
+class NumericAdd(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a + b
+        self.__class__ = GenericAdd
+        return GenericAdd.add(self, a, b)
+
+
+@define(eq=False)
+class StringAdd(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if (type(a) is str or type(a) is Rope) and (type(b) is str or type(b) is Rope):
+            return concat(a, b)
+        self.__class__ = GenericAdd
+        return GenericAdd.add(self, a, b)
+
+
+@define(eq=False)
+class Subtract(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a - b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class Multiply(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a * b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class Divide(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a / b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class Greater(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a > b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class GreaterEqual(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a >= b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class Less(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a < b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class LessEqual(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        b = self.right.visit(interpreter)
+        if type(a) is float and type(b) is float:
+            return a <= b
+        raise _numbers_error(self.operator)
+
+
+@define(eq=False)
+class Equal(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        return interpreter.is_equal(a, self.right.visit(interpreter))
+
+
+@define(eq=False)
+class NotEqual(Binary):
+    def evaluate(self, interpreter) -> object:
+        a = self.left.visit(interpreter)
+        return not interpreter.is_equal(a, self.right.visit(interpreter))
+
+
+@define(eq=False)
+class Negate(Unary):
+    def evaluate(self, interpreter) -> object:
+        value = self.right.visit(interpreter)
+        if type(value) is float:
+            return -value
+        raise LoxRuntimeError(self.operator, "Operand must be a number.")
+
+
+@define(eq=False)
+class Not(Unary):
+    def evaluate(self, interpreter) -> object:
+        value = self.right.visit(interpreter)
+        return value is None or value is False
+
+
+_BINARY = {
+    TokenType.PLUS: Add,
+    TokenType.MINUS: Subtract,
+    TokenType.STAR: Multiply,
+    TokenType.SLASH: Divide,
+    TokenType.GREATER: Greater,
+    TokenType.GREATER_EQUAL: GreaterEqual,
+    TokenType.LESS: Less,
+    TokenType.LESS_EQUAL: LessEqual,
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+}
+_UNARY = {TokenType.MINUS: Negate, TokenType.BANG: Not}
+
+
+def quicken(expr: Binary | Unary) -> None:
+    """Rewrites a generic Binary or Unary node into its operator's class."""
+    table = _BINARY if type(expr) is Binary else _UNARY
+    expr.__class__ = table[expr.operator.token_type]
@@ -3,9 +3,8 @@ from enum import Enum
 from typing import TypeGuard, Callable
 from .callable import LoxCallable, LoxFunction
 from .environment import Environment
-from .error import LoxRuntimeError, error_handler
+from .error import ErrorHandler, LoxRuntimeError
 from .expr import *
-from .interpreter import Interpreter
 from .stmt import *
 from .token import Token
 from .token_type import *
@@ -17,11 +16,25 @@ ClassType = Enum("ClassType", ["NONE", "CLASS"])
 
 @define
 class Resolver:
-    _interpreter: Interpreter
+    error_handler: ErrorHandler = Factory(ErrorHandler)
     _scopes: list[dict[str, bool]] = Factory(list)
+    # slot of every name declared in the corresponding scope, in declaration order
+    _slots: list[dict[str, int]] = Factory(list)
     # TODO: do we need factory here? :thinking:
     _current_function: FunctionType = FunctionType.NONE
     _current_class: ClassType = ClassType.NONE
+    # Purity analysis: the functions being resolved, innermost last, with the
+    # index of the scope holding their parameters; the functions declared in
+    # each scope; and the functions, or global names, each function calls.
+    # Functions start out pure, and are marked impure as they do something
+    # else than computing their result from their arguments, or once the whole
+    # program has been seen (see _settle_purity), if they call something that
+    # may not be pure.
+    _functions: list[tuple[Function, int]] = Factory(list)
+    _declarations: list[dict[str, Function]] = Factory(list)
+    _calls: dict[Function, list[Function | str]] = Factory(dict)
+    _global_functions: dict[str, list[Function]] = Factory(dict)
+    _rebound_globals: set[str] = Factory(set)
 
     def visit_block_stmt(self, stmt: Block) -> None:
         self._begin_scope()
@@ -31,12 +44,16 @@ class Resolver:
     def visit_class_stmt(self, stmt: Class) -> None:
         enclosing_class = self._current_class
         self._current_class = ClassType.CLASS
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name)
         self._define(stmt.name)
+        self._impure()
+        if stmt.slot is None:
+            self._rebound_globals.add(stmt.name.lexeme)
 
         self._begin_scope()
 
         self._scopes[-1]["this"] = True
+        self._slots[-1]["this"] = 0
         for method in stmt.methods:
             declaration = FunctionType.METHOD
             if method.name.lexeme == "init":
@@ -49,54 +66,107 @@ class Resolver:
     def resolve(self, statements: list[Stmt]) -> None:
         for statement in statements:
             self._resolve(statement)
+        if not self._scopes:
+            self._settle_purity()
 
     def _resolve(self, node: Stmt | Expr) -> None:
         node.visit(self)
 
     def _begin_scope(self) -> None:
         self._scopes.append({})
+        self._slots.append({})
+        self._declarations.append({})
 
     def _end_scope(self) -> None:
         self._scopes.pop()
+        self._slots.pop()
+        self._declarations.pop()
 
-    def _declare(self, name: Token) -> None:
+    def _declare(self, name: Token) -> int | None:
+        """Declares name in the innermost scope and returns its slot there."""
         if len(self._scopes) == 0:
-            return
+            return None
         scope = self._scopes[-1]
+        slots = self._slots[-1]
         if name.lexeme in scope:
-            error_handler.token_error(
+            self.error_handler.token_error(
                 name, "Already a variable with this name in this scope."
             )
+        else:
+            slots[name.lexeme] = len(slots)
         scope[name.lexeme] = False
+        return slots[name.lexeme]
 
     def _define(self, name: Token) -> None:
         if len(self._scopes) == 0:
             return
         self._scopes[-1][name.lexeme] = True
 
-    def _resolve_local(self, expr: Expr, name: Token) -> None:
-        for depth, scope in enumerate(reversed(self._scopes)):
-            if name.lexeme in scope:
-                self._interpreter.resolve(expr, depth)
+    def _resolve_local(self, expr: Assign | This | Variable, name: Token) -> None:
+        for depth, slots in enumerate(reversed(self._slots)):
+            if name.lexeme in slots:
+                expr.depth = depth
+                expr.slot = slots[name.lexeme]
                 return
 
+    def _is_local(self, depth: int | None) -> bool:
+        """Whether a variable resolved to depth belongs to the current function."""
+        if not self._functions:
+            return True
+        if depth is None:
+            return False
+        return len(self._scopes) - 1 - depth >= self._functions[-1][1]
+
+    def _impure(self) -> None:
+        if self._functions:
+            self._functions[-1][0].pure = False
+
+    def _settle_purity(self) -> None:
+        """Marks impure the functions that call something not known to be pure."""
+        for name, functions in self._global_functions.items():
+            if len(functions) > 1 or name in self._rebound_globals:
+                for function in functions:
+                    function.pure = False
+        changed = True
+        while changed:
+            changed = False
+            for function, callees in self._calls.items():
+                if function.pure and not all(map(self._is_pure, callees)):
+                    function.pure = False
+                    changed = True
+
+    def _is_pure(self, callee: Function | str) -> bool:
+        if isinstance(callee, str):
+            functions = self._global_functions.get(callee, [])
+            return len(functions) == 1 and functions[0].pure
+        return callee.pure
+
     def visit_expression_stmt(self, stmt: Expression) -> None:
         self._resolve(stmt.expression)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name)
         self._define(stmt.name)
+        # a function creating closures returns a new one on every call
+        self._impure()
+        if stmt.slot is None:
+            self._global_functions.setdefault(stmt.name.lexeme, []).append(stmt)
+        else:
+            self._declarations[-1][stmt.name.lexeme] = stmt
         self._resolve_function(stmt, FunctionType.FUNCTION)
 
     def _resolve_function(self, function: Function, function_type: FunctionType):
         enclosing_function = self._current_function
         self._current_function = function_type
+        function.pure = function_type == FunctionType.FUNCTION
 
         self._begin_scope()
+        self._functions.append((function, len(self._scopes) - 1))
         for param in function.parameters:
             self._declare(param)
             self._define(param)
         self.resolve(function.body)
+        self._functions.pop()
         self._end_scope()
 
         self._current_function = enclosing_function
@@ -109,23 +179,31 @@ class Resolver:
 
     def visit_print_stmt(self, stmt: Print) -> None:
         self._resolve(stmt.expression)
+        self._impure()
 
     def visit_return_stmt(self, stmt: Return) -> None:
         if self._current_function == FunctionType.NONE:
-            error_handler.token_error(stmt.keyword, "Can't return from top-level code.")
+            self.error_handler.token_error(
+                stmt.keyword, "Can't return from top-level code."
+            )
 
         if stmt.value is not None:
             if self._current_function == FunctionType.INITIALIZER:
-                error_handler.token_error(
+                self.error_handler.token_error(
                     stmt.keyword, "Can't return a value from an initializer."
                 )
             self._resolve(stmt.value)
+        # `return f(x);` can reuse the frame; the other places a call could be
+        # returned from were reported above
+        stmt.tail_call = isinstance(stmt.value, Call)
 
     def visit_var_stmt(self, stmt: Var) -> None:
-        self._declare(stmt.name)
+        stmt.slot = self._declare(stmt.name)
         if stmt.initializer is not None:
             self._resolve(stmt.initializer)
         self._define(stmt.name)
+        if stmt.slot is None:
+            self._rebound_globals.add(stmt.name.lexeme)
 
     def visit_while_stmt(self, stmt: While) -> None:
         self._resolve(stmt.condition)
@@ -134,18 +212,49 @@ class Resolver:
     def visit_assign_expr(self, expr: Assign) -> None:
         self._resolve(expr.value)
         self._resolve_local(expr, expr.name)
+        if expr.depth is None:
+            self._rebound_globals.add(expr.name.lexeme)
+        else:
+            scope = self._declarations[len(self._scopes) - 1 - expr.depth]
+            if expr.name.lexeme in scope:
+                # calls through the name may not reach the declaration anymore
+                scope[expr.name.lexeme].pure = False
+        if not self._is_local(expr.depth):
+            self._impure()
 
     def visit_binary_expr(self, expr: Binary) -> None:
         self._resolve(expr.left)
         self._resolve(expr.right)
 
     def visit_call_expr(self, expr: Call) -> None:
-        self._resolve(expr.callee)
+        if type(expr.callee) is Variable:
+            self._resolve_variable(expr.callee)
+            self._resolve_call(expr.callee)
+        else:
+            self._resolve(expr.callee)
+            self._impure()
         for argument in expr.arguments:
             self._resolve(argument)
 
+    def _resolve_call(self, callee: Variable) -> None:
+        """Records the function a call by name reaches, for purity analysis."""
+        if not self._functions:
+            return
+        if callee.depth is None:
+            target = callee.name.lexeme
+        else:
+            scope = self._declarations[len(self._scopes) - 1 - callee.depth]
+            target = scope.get(callee.name.lexeme)
+            if target is None or self._is_local(callee.depth):
+                # a parameter or variable could hold anything
+                self._impure()
+                return
+        self._calls.setdefault(self._functions[-1][0], []).append(target)
+
     def visit_get_expr(self, expr: Get) -> None:
         self._resolve(expr.expr_object)
+        # fields may change between calls
+        self._impure()
 
     def visit_grouping_expr(self, expr: Grouping) -> None:
         self._resolve(expr.expression)
@@ -160,21 +269,28 @@ class Resolver:
     def visit_set_expr(self, expr: Set) -> None:
         self._resolve(expr.value)
         self._resolve(expr.expr_object)
+        self._impure()
 
     def visit_this_expr(self, expr: This) -> None:
         if self._current_class == ClassType.NONE:
-            error_handler.token_error(
+            self.error_handler.token_error(
                 expr.keyword, "Can't use 'this' outside of a class."
             )
             return
         self._resolve_local(expr, expr.keyword)
+        self._impure()
 
     def visit_unary_expr(self, expr: Unary) -> None:
         self._resolve(expr.right)
 
     def visit_variable_expr(self, expr: Variable) -> None:
+        self._resolve_variable(expr)
+        if not self._is_local(expr.depth):
+            self._impure()
+
+    def _resolve_variable(self, expr: Variable) -> None:
         if len(self._scopes) > 0 and self._scopes[-1].get(expr.name.lexeme) == False:
-            error_handler.token_error(
+            self.error_handler.token_error(
                 expr.name, "Can't read local variable in its own initializer."
             )
         self._resolve_local(expr, expr.name)
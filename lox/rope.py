@@ -0,0 +1,63 @@
+from __future__ import annotations
+from attrs import define
+
+# Long Lox strings built with `+` are kept as ropes, so that growing a string
+# in a loop doesn't copy it on every iteration. A rope is only joined into a
+# str when something needs its characters: printing, comparing, or adding it
+# to the right of another string.
+
+# results of `+` shorter than this are plain strs
+ROPE_LENGTH = 1024
+
+
+@define(eq=False)
+class Rope:
+    """A string kept as the parts it was concatenated from.
+
+    Ropes share their list of parts with the rope they were extended from,
+    of which they use the first count, so appending to the latest rope takes
+    constant time.
+    """
+
+    _parts: list[str]
+    _count: int
+    length: int
+    _flat: str | None = None
+
+    def append(self, s: str) -> Rope:
+        parts = self._parts
+        if len(parts) != self._count:
+            # a longer rope has been made from this one already
+            parts = parts[: self._count]
+        parts.append(s)
+        return Rope(parts, len(parts), self.length + len(s))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        if self._flat is None:
+            self._flat = "".join(self._parts[: self._count])
+        return self._flat
+
+
+def concat(a: str | Rope, b: str | Rope) -> str | Rope:
+    """The Lox string a + b."""
+    if type(b) is Rope:
+        b = str(b)
+    if type(a) is Rope:
+        return a.append(b)
+    if len(a) + len(b) < ROPE_LENGTH:
+        return a + b
+    return Rope([a, b], 2, len(a) + len(b))
+
+
+def is_string(value: object) -> bool:
+    return type(value) is str or type(value) is Rope
+
+
+def equal(a: object, b: object) -> bool:
+    """Lox equality where one of a or b is a rope."""
+    if not is_string(a) or not is_string(b) or len(a) != len(b):
+        return False
+    return str(a) == str(b)
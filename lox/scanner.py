@@ -1,17 +1,55 @@
+import re
 from attrs import define, Factory
-from typing import List
-from .error import error_handler
+from typing import Iterator, List
+from .error import ErrorHandler
 from .token_type import *
 from .token import Token
 
+# One alternative per kind of lexeme, tried in order at the current position.
+# Whitespace, newlines and comments are matched in bulk so they cost a single
+# match each; anything left over is a character Lox does not know.
+_LEXEME = re.compile(
+    r"""
+    (?P<blank>(?:[ \r\t\n]|//[^\n]*)+)
+  | (?P<identifier>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<number>[0-9]+(?:\.[0-9]+)?)
+  | (?P<operator>[!=<>]=?|[(){},.\-+;*/])
+  | (?P<string>"[^"]*")
+  | (?P<unterminated>"[^"]*)
+  | (?P<unexpected>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_OPERATORS = {
+    "(": LEFT_PAREN,
+    ")": RIGHT_PAREN,
+    "{": LEFT_BRACE,
+    "}": RIGHT_BRACE,
+    ",": COMMA,
+    ".": DOT,
+    "-": MINUS,
+    "+": PLUS,
+    ";": SEMICOLON,
+    "*": STAR,
+    "/": SLASH,
+    "!": BANG,
+    "!=": BANG_EQUAL,
+    "=": EQUAL,
+    "==": EQUAL_EQUAL,
+    "<": LESS,
+    "<=": LESS_EQUAL,
+    ">": GREATER,
+    ">=": GREATER_EQUAL,
+}
+
 
 @define
 class Scanner:
     source: str
     tokens: List[Token] = Factory(list)
-    start: int = 0
-    current: int = 0
     line: int = 1
+    error_handler: ErrorHandler = Factory(ErrorHandler)
 
     _keywords = {
         "and": AND,
@@ -33,148 +71,32 @@ class Scanner:
     }
 
     def scan_tokens(self) -> List[Token]:
-        while not self.at_end():
-            self.start = self.current
-            self.scan_token()
-
-        self.tokens.append(Token(EOF, "", None, self.line))
+        self.tokens.extend(self.iter_tokens())
         return self.tokens
 
-    def at_end(self) -> bool:
-        return self.current >= len(self.source)
-
-    # TODO: use generator! how does it work again?
-    def advance(self) -> str:
-        c = self.source[self.current]
-        self.current += 1
-        return c
-
-    def match(self, expected):
-        if self.at_end():
-            return False
-        if self.source[self.current] != expected:
-            return False
-
-        self.current += 1
-        return True
-
-    def peek(self):
-        if self.at_end():
-            return "\0"
-        return self.source[self.current]
-
-    def peek_next(self):
-        if self.current + 1 >= len(self.source):
-            return "\0"
-        return self.source[self.current + 1]
-
-    def add_token(self, token_type: TokenType, literal: object = None):
-        text = self.source[self.start : self.current]
-        self.tokens.append(Token(token_type, text, literal, self.line))
-
-    def discard_line(self):
-        while self.peek() != "\n" and not self.at_end():
-            self.advance()
-
-    def scan_token(self) -> None:
-        c = self.advance()
-        match c:
-            case "(":
-                self.add_token(LEFT_PAREN)
-            case ")":
-                self.add_token(RIGHT_PAREN)
-            case "{":
-                self.add_token(LEFT_BRACE)
-            case "}":
-                self.add_token(RIGHT_BRACE)
-            case ",":
-                self.add_token(COMMA)
-            case ".":
-                self.add_token(DOT)
-            case "-":
-                self.add_token(MINUS)
-            case "+":
-                self.add_token(PLUS)
-            case ";":
-                self.add_token(SEMICOLON)
-            case "*":
-                self.add_token(STAR)
-            case "!":
-                if self.match("="):
-                    self.add_token(BANG_EQUAL)
-                else:
-                    self.add_token(BANG)
-            case "=":
-                if self.match("="):
-                    self.add_token(EQUAL_EQUAL)
-                else:
-                    self.add_token(EQUAL)
-            case "<":
-                if self.match("="):
-                    self.add_token(LESS_EQUAL)
-                else:
-                    self.add_token(LESS)
-            case ">":
-                if self.match("="):
-                    self.add_token(GREATER_EQUAL)
-                else:
-                    self.add_token(GREATER)
-            case "/":
-                if self.match("/"):
-                    self.discard_line()
-                else:
-                    self.add_token(SLASH)
-            case " " | "\r" | "\t":
-                # Ignore whitespace
-                pass
-            case "\n":
-                self.line += 1
-            case '"':
-                self.string()
-            case _:
-                if self.is_digit(c):
-                    self.number()
-                elif self.is_alpha(c):
-                    self.identifier()
-                else:
-                    error_handler.error(self.line, "Unexpected character.")
-
-    def is_digit(self, c):
-        return c in set("0123456789")
-
-    def is_alpha(self, c):
-        return c in set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
-
-    def is_alphanumeric(self, c) -> bool:
-        return self.is_alpha(c) or self.is_digit(c)
-
-    def identifier(self) -> None:
-        while self.is_alphanumeric(self.peek()):
-            self.advance()
-        text = self.source[self.start : self.current]
-        token_type = self._keywords.get(text, IDENTIFIER)
-        self.add_token(token_type)
-
-    def string(self) -> None:
-        while self.peek() != '"' and not self.at_end():
-            if self.peek() == "\n":
-                self.line += 1
-            self.advance()
-
-        if self.at_end():
-            error_handler.error(self.line, "Unterminated string.")
-            return
-
-        self.advance()
-
-        value = self.source[self.start + 1 : self.current - 1]
-        self.add_token(STRING, value)
-
-    def number(self) -> None:
-        while self.is_digit(self.peek()):
-            self.advance()
-        if self.peek() == "." and self.is_digit(self.peek_next()):
-            self.advance()
-        while self.is_digit(self.peek()):
-            self.advance()
-        self.add_token(NUMBER, float(self.source[self.start : self.current]))
+    def iter_tokens(self) -> Iterator[Token]:
+        """Yields the tokens of the source one by one, ending with EOF."""
+        keywords = self._keywords
+        line = self.line
+        for match in _LEXEME.finditer(self.source):
+            kind = match.lastgroup
+            text = match.group()
+            if kind == "blank":
+                line += text.count("\n")
+            elif kind == "identifier":
+                yield Token(keywords.get(text, IDENTIFIER), text, None, line)
+            elif kind == "operator":
+                yield Token(_OPERATORS[text], text, None, line)
+            elif kind == "number":
+                yield Token(NUMBER, text, float(text), line)
+            elif kind == "string":
+                # a multi-line string reports the line it ends on
+                line += text.count("\n")
+                yield Token(STRING, text, text[1:-1], line)
+            elif kind == "unterminated":
+                line += text.count("\n")
+                self.error_handler.error(line, "Unterminated string.")
+            else:
+                self.error_handler.error(line, "Unexpected character.")
+        self.line = line
+        yield Token(EOF, "", None, line)
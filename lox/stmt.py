@@ -4,88 +4,101 @@ from .expr import Expr
 from .token import Token
 
 
-@define(frozen=True)
+# Like expressions, statements are annotated in place by the resolver:
+# declarations record the slot they occupy in their scope, None meaning the
+# declaration is global.
+
+
+@define(eq=False)
 class Stmt:
     # TODO: make abstract method? How to define this interface?
     def visit(self, visitor):
         pass
 
 
-@define(frozen=True)
+@define(eq=False)
 class Block(Stmt):
     statements: list[Stmt]
 
     def visit(self, visitor):
-        visitor.visit_block_stmt(self)
+        return visitor.visit_block_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Expression(Stmt):
     expression: Expr
 
     def visit(self, visitor):
-        visitor.visit_expression_stmt(self)
+        return visitor.visit_expression_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class If(Stmt):
     condition: Expr
     then_branch: Stmt
     else_branch: Stmt | None
 
     def visit(self, visitor):
-        visitor.visit_if_stmt(self)
+        return visitor.visit_if_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Function(Stmt):
     name: Token
     parameters: list[Token]
     body: list[Stmt]
+    slot: Optional[int] = None
+    # set by the resolver for functions whose result only depends on their
+    # arguments, and which do nothing else
+    pure: bool = False
 
     def visit(self, visitor):
-        visitor.visit_function_stmt(self)
+        return visitor.visit_function_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Class(Stmt):
     name: Token
     methods: list[Function]
+    slot: Optional[int] = None
 
     def visit(self, visitor):
-        visitor.visit_class_stmt(self)
+        return visitor.visit_class_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Print(Stmt):
     expression: Expr
 
     def visit(self, visitor):
-        visitor.visit_print_stmt(self)
+        return visitor.visit_print_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Return(Stmt):
     keyword: Token
     value: Expr | None
+    # set by the resolver when value is a call whose result is returned as is
+    tail_call: bool = False
 
     def visit(self, visitor):
-        visitor.visit_return_stmt(self)
+        return visitor.visit_return_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class Var(Stmt):
     name: Token
     initializer: Optional[Expr]
+    slot: Optional[int] = None
 
     def visit(self, visitor):
-        visitor.visit_var_stmt(self)
+        return visitor.visit_var_stmt(self)
 
 
-@define(frozen=True)
+@define(eq=False)
 class While(Stmt):
     condition: Expr
     body: Stmt
 
     def visit(self, visitor):
-        visitor.visit_while_stmt(self)
+        return visitor.visit_while_stmt(self)
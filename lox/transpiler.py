@@ -0,0 +1,629 @@
+from __future__ import annotations
+import attrs
+from attrs import define, Factory
+from types import MethodType
+from typing import Callable, Iterator
+from .callable import LoxCallable, LoxInstance
+from .error import LoxRuntimeError, NativeError
+from .expr import *
+from .interpreter import Interpreter
+from .stmt import *
+from .token import Token
+from .token_type import *
+
+# Name mangling keeps Lox identifiers apart from Python keywords, builtins and
+# the runtime helpers below (which all start with an underscore):
+#   g_<name>        Lox global
+#   l<n>_<name>     Lox local or parameter
+#   f<n>_<name>     Python function implementing a Lox function
+#   C<n>_<name>     Python class implementing a Lox class
+#   f_<name>        instance field, m_<name> method
+#   _t<n>           temporary used to evaluate an operand exactly once
+FILENAME = "<lox>"
+
+
+@define
+class TranspiledFunction(LoxCallable):
+    name: str
+    _arity: int
+    function: Callable
+
+    def arity(self) -> int:
+        return self._arity
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        return self.function(*arguments)
+
+    def __str__(self) -> str:
+        return f"<fn {self.name}>"
+
+
+class TranspiledInstance:
+    """Base of the Python classes generated for Lox classes."""
+
+    __slots__ = ()
+    __lox_name__ = ""
+
+    def __str__(self) -> str:
+        return f"{self.__lox_name__} instance"
+
+
+@define
+class TranspiledClass(LoxCallable):
+    name: str
+    python_class: type[TranspiledInstance]
+
+    def arity(self) -> int:
+        initializer = getattr(self.python_class, "m_init", None)
+        if initializer is None:
+            return 0
+        return initializer.__code__.co_argcount - 1
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        instance = self.python_class.__new__(self.python_class)
+        initializer = getattr(instance, "m_init", None)
+        if initializer is not None:
+            initializer(*arguments)
+        return instance
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def _error(line: int, message: str) -> LoxRuntimeError:
+    return LoxRuntimeError(Token(EOF, "", None, line), message)
+
+
+def _numbers_error(line: int):
+    raise _error(line, "Operands must be numbers.")
+
+
+def _plus_error(line: int):
+    raise _error(line, "Operands must be two numbers or two strings.")
+
+
+def _operand_error(line: int):
+    raise _error(line, "Operand must be a number.")
+
+
+# LoxInstances come from native classes like Array, which are LoxCallables
+_IDENTITY_TYPES = (TranspiledInstance, LoxCallable, LoxInstance)
+
+
+def _is_equal(a, b) -> bool:
+    # mirrors Interpreter.is_equal: 1 == true is false, objects compare by identity
+    if a is None:
+        return b is None
+    kind = type(a)
+    if kind is float or kind is str or kind is bool:
+        return kind is type(b) and a == b
+    return a is b and isinstance(a, _IDENTITY_TYPES)
+
+
+def _make_call(interpreter: Interpreter) -> Callable:
+    def call(callee, line, *arguments):
+        if type(callee) is MethodType:
+            arity = callee.__code__.co_argcount - 1
+            if len(arguments) != arity:
+                raise _error(
+                    line, f"Expected {arity} arguments but got {len(arguments)}."
+                )
+            return callee(*arguments)
+        if isinstance(callee, LoxCallable):
+            if len(arguments) != callee.arity():
+                raise _error(
+                    line,
+                    f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+                )
+            try:
+                return callee.call(interpreter, list(arguments))
+            except NativeError as e:
+                raise _error(line, e.message) from None
+        raise _error(line, "Can only call functions and classes.")
+
+    return call
+
+
+def _method(obj, field: str, method: str, name: str, line: int):
+    """Looks up a property that is about to be called.
+
+    Methods come back as plain bound Python methods, which the caller invokes
+    directly instead of wrapping them into a Lox function first.
+    """
+    if isinstance(obj, LoxInstance):
+        return obj.get(Token(IDENTIFIER, name, None, line))
+    if not isinstance(obj, TranspiledInstance):
+        raise _error(line, "Only instances have properties.")
+    try:
+        return getattr(obj, field)
+    except AttributeError:
+        pass
+    function = getattr(obj, method, None)
+    if function is None:
+        raise _error(line, f"Undefined property '{name}'.")
+    return function
+
+
+def _get(obj, field: str, method: str, name: str, line: int):
+    value = _method(obj, field, method, name, line)
+    if type(value) is MethodType:
+        return TranspiledFunction(name, value.__code__.co_argcount - 1, value)
+    return value
+
+
+def _set(obj, field: str, line: int, value):
+    if isinstance(obj, LoxInstance):
+        obj.set(Token(IDENTIFIER, field[2:], None, line), value)
+        return value
+    if not isinstance(obj, TranspiledInstance):
+        raise _error(line, "Only instances have fields.")
+    setattr(obj, field, value)
+    return value
+
+
+def _make_set_global(namespace: dict[str, object]) -> Callable:
+    def set_global(name: str, line: int, value):
+        if name not in namespace:
+            raise _error(line, f"Undefined variable '{name[2:]}'.")
+        namespace[name] = value
+        return value
+
+    return set_global
+
+
+_NO_RETURN = object()
+
+
+def _walk(node: Expr | Stmt) -> Iterator[Expr | Stmt]:
+    yield node
+    for field in attrs.fields(type(node)):
+        value = getattr(node, field.name)
+        if isinstance(value, (Expr, Stmt)):
+            yield from _walk(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, (Expr, Stmt)):
+                    yield from _walk(item)
+
+
+def _names_used_by_functions(statements: list[Stmt]) -> set[str]:
+    names = set()
+    for statement in statements:
+        for node in _walk(statement):
+            if isinstance(node, Function):
+                for inner in _walk(node):
+                    if isinstance(inner, (Variable, Assign)):
+                        names.add(inner.name.lexeme)
+    return names
+
+
+@define
+class _PyFunction:
+    """A Python function whose body is being generated."""
+
+    # (indent relative to the body, code, Lox line of every global read there)
+    lines: list[tuple[int, str, dict[str, int]]] = Factory(list)
+    nonlocals: set[str] = Factory(set)
+    globals: set[str] = Factory(set)
+    loop_depth: int = 0
+    is_initializer: bool = False
+
+    def header(self) -> list[tuple[int, str, dict[str, int]]]:
+        header = []
+        if self.globals:
+            header.append((0, f"global {', '.join(sorted(self.globals))}", {}))
+        if self.nonlocals:
+            header.append((0, f"nonlocal {', '.join(sorted(self.nonlocals))}", {}))
+        return header
+
+
+@define
+class Transpiler:
+    """Translates a resolved program into the source of a Python module.
+
+    The module defines `_main`, which runs the program. Lox functions become
+    Python functions sharing variables through closures and `nonlocal`, Lox
+    classes become Python classes with `__slots__`, and every operation whose
+    Lox semantics differ from Python's (truthiness, arithmetic on non-numbers,
+    equality) is spelled out explicitly.
+    """
+
+    _counter: int = 0
+    _fn: _PyFunction = Factory(_PyFunction)
+    _level: int = 0
+    # Python name of every slot in the Lox scopes enclosing the current node
+    _scopes: list[list[str]] = Factory(list)
+    # which Python function declares each local
+    _owners: dict[str, _PyFunction] = Factory(dict)
+    _reads: dict[str, int] = Factory(dict)
+
+    def transpile(self, statements: list[Stmt]) -> tuple[str, list[dict[str, int]]]:
+        """Returns the module source and the global reads of every line."""
+        main = self._fn
+        for statement in statements:
+            self._statement(statement)
+        lines = [(0, "def _main():", {})]
+        lines += self._indented(main.header() + main.lines, 1)
+        source = "\n".join("    " * level + text for level, text, _ in lines)
+        return source + "\n", [reads for _, _, reads in lines]
+
+    def _indented(self, lines, level: int):
+        return [(level + indent, text, reads) for indent, text, reads in lines]
+
+    def _emit(self, text: str) -> None:
+        self._fn.lines.append((self._level, text, self._reads))
+        self._reads = {}
+
+    def _fresh(self, prefix: str, name: str = "") -> str:
+        self._counter += 1
+        return f"{prefix}{self._counter}_{name}" if name else f"{prefix}{self._counter}"
+
+    def _statement(self, stmt: Stmt) -> None:
+        stmt.visit(self)
+
+    def _expression(self, expr: Expr) -> str:
+        return expr.visit(self)
+
+    def _declare(self, name: Token, slot: int | None) -> str:
+        if slot is None:
+            self._fn.globals.add(f"g_{name.lexeme}")
+            return f"g_{name.lexeme}"
+        python_name = self._fresh("l", name.lexeme)
+        self._scopes[-1].append(python_name)
+        self._owners[python_name] = self._fn
+        return python_name
+
+    def _local(self, depth: int, slot: int) -> str:
+        return self._scopes[-1 - depth][slot]
+
+    def _truthy(self, code: str) -> str:
+        temporary = self._fresh("_t")
+        return f"(({temporary} := {code}) is not None and {temporary} is not False)"
+
+    def _function(
+        self, stmt: Function, is_initializer: bool = False
+    ) -> tuple[_PyFunction, list[str]]:
+        enclosing_fn, enclosing_level = self._fn, self._level
+        self._fn = _PyFunction(is_initializer=is_initializer)
+        self._level = 0
+        self._scopes.append([])
+        parameters = [self._declare(parameter, 0) for parameter in stmt.parameters]
+        for statement in stmt.body:
+            self._statement(statement)
+        if is_initializer:
+            self._emit("return self")
+        elif not self._fn.lines:
+            self._emit("pass")
+        self._scopes.pop()
+        function = self._fn
+        self._fn, self._level = enclosing_fn, enclosing_level
+        return function, parameters
+
+    def _emit_def(self, name: str, parameters: list[str], function: _PyFunction):
+        self._emit(f"def {name}({', '.join(parameters)}):")
+        body = self._indented(function.header() + function.lines, self._level + 1)
+        self._fn.lines.extend(body)
+
+    def _emit_statements(self, statements: list[Stmt]) -> None:
+        before = len(self._fn.lines)
+        for statement in statements:
+            self._statement(statement)
+        if len(self._fn.lines) == before:
+            self._emit("pass")
+
+    def visit_block_stmt(self, stmt: Block) -> None:
+        declared = {
+            s.name.lexeme
+            for s in stmt.statements
+            if isinstance(s, (Var, Function, Class))
+        }
+        captured = declared & _names_used_by_functions(stmt.statements)
+        self._scopes.append([])
+        if self._fn.loop_depth == 0 or not captured:
+            self._emit_statements(stmt.statements)
+            self._scopes.pop()
+            return
+
+        # Lox creates fresh variables on every iteration, which closures must
+        # observe, so the block runs as its own Python function
+        enclosing_fn, enclosing_level = self._fn, self._level
+        self._fn = _PyFunction(is_initializer=enclosing_fn.is_initializer)
+        self._level = 0
+        for statement in stmt.statements:
+            self._statement(statement)
+        self._emit("return _NO_RETURN")
+        block = self._fn
+        self._fn, self._level = enclosing_fn, enclosing_level
+        self._scopes.pop()
+
+        name = self._fresh("b")
+        self._emit_def(name, [], block)
+        result = self._fresh("_t")
+        self._emit(f"{result} = {name}()")
+        self._emit(f"if {result} is not _NO_RETURN:")
+        self._level += 1
+        self._emit(f"return {result}")
+        self._level -= 1
+
+    def visit_class_stmt(self, stmt: Class) -> None:
+        class_name = self._fresh("C", stmt.name.lexeme)
+        fields = sorted(
+            {
+                node.name.lexeme
+                for method in stmt.methods
+                for node in _walk(method)
+                if isinstance(node, Set) and isinstance(node.expr_object, This)
+            }
+        )
+        # fields assigned through `this` get slots, any others land in __dict__
+        slots = tuple(f"f_{field}" for field in fields) + ("__dict__",)
+        name = self._declare(stmt.name, stmt.slot)
+
+        self._emit(f"class {class_name}(_Instance):")
+        self._level += 1
+        self._emit(f"__slots__ = {slots!r}")
+        self._emit(f"__lox_name__ = {stmt.name.lexeme!r}")
+        self._scopes.append(["self"])
+        for method in stmt.methods:
+            is_initializer = method.name.lexeme == "init"
+            function, parameters = self._function(method, is_initializer)
+            self._emit_def(f"m_{method.name.lexeme}", ["self"] + parameters, function)
+        self._scopes.pop()
+        self._level -= 1
+        self._emit(f"{name} = _Class({stmt.name.lexeme!r}, {class_name})")
+
+    def visit_expression_stmt(self, stmt: Expression) -> None:
+        self._emit(self._expression(stmt.expression))
+
+    def visit_function_stmt(self, stmt: Function) -> None:
+        name = self._declare(stmt.name, stmt.slot)
+        python_name = self._fresh("f", stmt.name.lexeme)
+        function, parameters = self._function(stmt)
+        self._emit_def(python_name, parameters, function)
+        self._emit(
+            f"{name} = _Function({stmt.name.lexeme!r}, "
+            f"{len(stmt.parameters)}, {python_name})"
+        )
+
+    def visit_if_stmt(self, stmt: If) -> None:
+        self._emit(f"if {self._truthy(self._expression(stmt.condition))}:")
+        self._level += 1
+        self._emit_statements([stmt.then_branch])
+        self._level -= 1
+        if stmt.else_branch is not None:
+            self._emit("else:")
+            self._level += 1
+            self._emit_statements([stmt.else_branch])
+            self._level -= 1
+
+    def visit_print_stmt(self, stmt: Print) -> None:
+        value = self._expression(stmt.expression)
+        self._emit(f"print(_stringify({value}), file=_stdout)")
+
+    def visit_return_stmt(self, stmt: Return) -> None:
+        if self._fn.is_initializer:
+            self._emit("return self")
+        elif stmt.value is None:
+            self._emit("return None")
+        else:
+            self._emit(f"return {self._expression(stmt.value)}")
+
+    def visit_var_stmt(self, stmt: Var) -> None:
+        value = "None"
+        if stmt.initializer is not None:
+            value = self._expression(stmt.initializer)
+        self._emit(f"{self._declare(stmt.name, stmt.slot)} = {value}")
+
+    def visit_while_stmt(self, stmt: While) -> None:
+        self._emit(f"while {self._truthy(self._expression(stmt.condition))}:")
+        self._level += 1
+        self._fn.loop_depth += 1
+        self._emit_statements([stmt.body])
+        self._fn.loop_depth -= 1
+        self._level -= 1
+
+    def visit_assign_expr(self, expr: Assign) -> str:
+        value = self._expression(expr.value)
+        if expr.depth is None:
+            # assigning an undefined global is an error
+            return f"_set_global('g_{expr.name.lexeme}', {expr.name.line}, {value})"
+        name = self._local(expr.depth, expr.slot)
+        if self._owners[name] is not self._fn:
+            self._fn.nonlocals.add(name)
+        return f"({name} := {value})"
+
+    def visit_binary_expr(self, expr: Binary) -> str:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        line = expr.operator.line
+        a = self._fresh("_t")
+        b = self._fresh("_t")
+        match expr.operator.token_type:
+            case TokenType.EQUAL_EQUAL:
+                return f"_is_equal({left}, {right})"
+            case TokenType.BANG_EQUAL:
+                return f"(not _is_equal({left}, {right}))"
+            case TokenType.PLUS:
+                return (
+                    f"({a} + {b} if type({a} := {left}) is type({b} := {right}) "
+                    f"and (type({a}) is float or type({a}) is str) "
+                    f"else _plus_error({line}))"
+                )
+        operator = {
+            TokenType.GREATER: ">",
+            TokenType.GREATER_EQUAL: ">=",
+            TokenType.LESS: "<",
+            TokenType.LESS_EQUAL: "<=",
+            TokenType.MINUS: "-",
+            TokenType.SLASH: "/",
+            TokenType.STAR: "*",
+        }[expr.operator.token_type]
+        # `&` rather than `and`: both operands are evaluated before the check
+        return (
+            f"({a} {operator} {b} if (type({a} := {left}) is float) "
+            f"& (type({b} := {right}) is float) else _numbers_error({line}))"
+        )
+
+    def visit_call_expr(self, expr: Call) -> str:
+        callee = self._fresh("_t")
+        arguments = [self._expression(argument) for argument in expr.arguments]
+        joined = ", ".join(arguments)
+        line = expr.paren.line
+        slow = f"_call({callee}, {line}{''.join(', ' + a for a in arguments)})"
+        if isinstance(expr.callee, Get):
+            # call methods directly instead of materialising a bound function
+            get = expr.callee
+            obj = self._expression(get.expr_object)
+            name = get.name.lexeme
+            method = (
+                f"_method({obj}, 'f_{name}', 'm_{name}', {name!r}, {get.name.line})"
+            )
+            return (
+                f"({callee}({joined}) if type({callee} := {method}) is _MethodType "
+                f"and {callee}.__code__.co_argcount == {len(arguments) + 1} "
+                f"else {slow})"
+            )
+        return (
+            f"({callee}.function({joined}) if type({callee} := "
+            f"{self._expression(expr.callee)}) is _Function "
+            f"and {callee}._arity == {len(arguments)} else {slow})"
+        )
+
+    def visit_get_expr(self, expr: Get) -> str:
+        obj = self._expression(expr.expr_object)
+        name = expr.name.lexeme
+        return f"_get({obj}, 'f_{name}', 'm_{name}', {name!r}, {expr.name.line})"
+
+    def visit_grouping_expr(self, expr: Grouping) -> str:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal) -> str:
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr: Logical) -> str:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        value = self._fresh("_t")
+        truthy = f"(({value} := {left}) is not None and {value} is not False)"
+        if expr.operator.token_type == OR:
+            return f"({value} if {truthy} else {right})"
+        return f"({right} if {truthy} else {value})"
+
+    def visit_set_expr(self, expr: Set) -> str:
+        obj = self._expression(expr.expr_object)
+        value = self._expression(expr.value)
+        name = expr.name.lexeme
+        return f"_set({obj}, 'f_{name}', {expr.name.line}, {value})"
+
+    def visit_this_expr(self, expr: This) -> str:
+        return self._local(expr.depth, expr.slot)
+
+    def visit_unary_expr(self, expr: Unary) -> str:
+        right = self._expression(expr.right)
+        value = self._fresh("_t")
+        if expr.operator.token_type == BANG:
+            return f"(({value} := {right}) is None or {value} is False)"
+        return (
+            f"(-{value} if type({value} := {right}) is float "
+            f"else _operand_error({expr.operator.line}))"
+        )
+
+    def visit_variable_expr(self, expr: Variable) -> str:
+        if expr.depth is None:
+            self._reads.setdefault(expr.name.lexeme, expr.name.line)
+            return f"g_{expr.name.lexeme}"
+        return self._local(expr.depth, expr.slot)
+
+
+@define
+class TranspilingInterpreter(Interpreter):
+    """Runs programs by translating them to Python and executing the result."""
+
+    _namespace: dict[str, object] = Factory(dict)
+
+    @classmethod
+    def prepare(cls, statements: list[Stmt]) -> tuple:
+        """The code object, its reads and the statements, for run_prepared.
+
+        The code is None when CPython can't compile it, so that the
+        statements run on the tree walker instead.
+        """
+        source, reads = Transpiler().transpile(statements)
+        try:
+            code = compile(source, FILENAME, "exec")
+        except SyntaxError:
+            # CPython refuses more than 20 statically nested blocks, which
+            # deeply nested loops turn into; the tree walker has no such limit
+            code = None
+        return code, reads, statements
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        self.run_prepared(self.prepare(statements))
+
+    def run_prepared(self, prepared: tuple) -> None:
+        code, reads, statements = prepared
+        if code is None:
+            self._interpret_on_tree(statements)
+            return
+        namespace = self._runtime()
+        exec(code, namespace)
+        try:
+            namespace["_main"]()
+        except LoxRuntimeError as e:
+            self.error_handler.runtime_error(e)
+        except NameError as e:
+            self.error_handler.runtime_error(self._undefined_variable(e, reads))
+
+    def _interpret_on_tree(self, statements: list[Stmt]) -> None:
+        namespace = self._runtime()
+        self.global_env.values.update(self.global_values())
+        Interpreter.interpret(self, statements)
+        for name, value in self.global_env.values.items():
+            namespace[f"g_{name}"] = value
+
+    def _runtime(self) -> dict[str, object]:
+        namespace = self._namespace
+        if not namespace:
+            namespace.update(
+                _Function=TranspiledFunction,
+                _Class=TranspiledClass,
+                _Instance=TranspiledInstance,
+                _MethodType=MethodType,
+                _NO_RETURN=_NO_RETURN,
+                _call=_make_call(self),
+                _set_global=_make_set_global(namespace),
+                _method=_method,
+                _get=_get,
+                _set=_set,
+                _is_equal=_is_equal,
+                _numbers_error=_numbers_error,
+                _plus_error=_plus_error,
+                _operand_error=_operand_error,
+                _stringify=self.stringify,
+            )
+        namespace["_stdout"] = self.stdout
+        for name, value in self.global_env.values.items():
+            namespace.setdefault(f"g_{name}", value)
+        return namespace
+
+    def global_values(self) -> dict[str, object]:
+        # globals live in the namespace of the generated code, see _runtime
+        values = dict(self.global_env.values)
+        for name, value in self._namespace.items():
+            if name.startswith("g_"):
+                values[name[2:]] = value
+        return values
+
+    def _undefined_variable(
+        self, error: NameError, reads: list[dict[str, int]]
+    ) -> LoxRuntimeError:
+        if error.name is None or not error.name.startswith("g_"):
+            raise error
+        name = error.name[2:]
+        traceback = error.__traceback__
+        line = 0
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == FILENAME:
+                line = reads[traceback.tb_lineno - 1].get(name, line)
+            traceback = traceback.tb_next
+        return _error(line, f"Undefined variable '{name}'.")
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import operator
+from array import array
+from typing import Callable
+from attrs import define
+from .callable import LoxCallable, LoxFunction, LoxInstance
+from .error import NativeError
+from .expr import *
+from .natives import LoxArray, NativeClass, NativeMethod
+from .stmt import Return
+from .token_type import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Vector, a fixed number of numbers with bulk operations that run in Python
+# instead of Lox: on a float64 NumPy array when NumPy is installed, and on an
+# array('d') otherwise.
+#
+#   var v = Vector(n);  v.get(i); v.set(i, x); v.length(); v.toArray();
+#   v.add(w); v.mul(w); elementwise, with w a Vector as long as v or a number
+#   v.dot(w); v.sum(); v.min(); v.max();
+#   v.map(f);           a Vector of f(x) for every element x
+#
+# map calls f once per element, unless f is a function of one parameter that
+# only returns arithmetic on the parameter and numbers, like
+# `fun f(x) { return 2 * x + 1; }`. Such an f is turned into a Python function,
+# which NumPy applies to the whole array in one go.
+
+_OPERATORS = {
+    TokenType.PLUS: operator.add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.SLASH: operator.truediv,
+}
+
+
+def _zeros(size: int):
+    if numpy is not None:
+        return numpy.zeros(size)
+    return array("d", bytes(8 * size))
+
+
+def _compile(function: LoxCallable) -> Callable | None:
+    """The Python equivalent of a Lox function that only does arithmetic."""
+    if not isinstance(function, LoxFunction):
+        return None
+    declaration = function.declaration
+    if len(declaration.parameters) != 1 or len(declaration.body) != 1:
+        return None
+    statement = declaration.body[0]
+    if type(statement) is not Return or statement.value is None:
+        return None
+    return _compile_expression(statement.value)
+
+
+def _compile_expression(expr: Expr) -> Callable | None:
+    if type(expr) is Literal:
+        value = expr.value
+        return (lambda x: value) if type(value) is float else None
+    if type(expr) is Variable:
+        # the parameter is the first slot of the function's scope
+        return (lambda x: x) if expr.depth == 0 and expr.slot == 0 else None
+    if type(expr) is Grouping:
+        return _compile_expression(expr.expression)
+    if isinstance(expr, Unary):
+        right = _compile_expression(expr.right)
+        if expr.operator.token_type != TokenType.MINUS or right is None:
+            return None
+        return lambda x: -right(x)
+    if isinstance(expr, Binary):
+        op = _OPERATORS.get(expr.operator.token_type)
+        left = _compile_expression(expr.left)
+        right = _compile_expression(expr.right)
+        if op is None or left is None or right is None:
+            return None
+        return lambda x: op(left(x), right(x))
+    return None
+
+
+@define(eq=False)
+class LoxVector(LoxInstance):
+    data: object = None
+
+    def init(self, size: object) -> None:
+        if type(size) is not float or not size.is_integer() or size < 0:
+            raise NativeError("Size must be a whole number.")
+        self.data = _zeros(int(size))
+
+    def get_item(self, index: object) -> float:
+        return float(self.data[self._index(index)])
+
+    def set_item(self, index: object, value: object) -> object:
+        index = self._index(index)
+        if type(value) is not float:
+            raise NativeError("Vector elements must be numbers.")
+        self.data[index] = value
+        return value
+
+    def length(self) -> float:
+        return float(len(self.data))
+
+    def add(self, other: object) -> LoxVector:
+        return self._elementwise(operator.add, other)
+
+    def mul(self, other: object) -> LoxVector:
+        return self._elementwise(operator.mul, other)
+
+    def dot(self, other: object) -> float:
+        other = self._operand(other)
+        if type(other) is float:
+            raise NativeError("Operand must be a vector.")
+        if numpy is not None:
+            return float(numpy.dot(self.data, other))
+        return float(sum(map(operator.mul, self.data, other)))
+
+    def sum(self) -> float:
+        if numpy is not None:
+            return float(self.data.sum())
+        return float(sum(self.data))
+
+    def min(self) -> float:
+        self._non_empty()
+        return float(self.data.min() if numpy is not None else min(self.data))
+
+    def max(self) -> float:
+        self._non_empty()
+        return float(self.data.max() if numpy is not None else max(self.data))
+
+    def map(self, interpreter, function: object) -> LoxVector:
+        if not isinstance(function, LoxCallable) or function.arity() != 1:
+            raise NativeError("Operand must be a function of one argument.")
+        compiled = _compile(function)
+        if compiled is not None and numpy is not None:
+            data = compiled(self.data)
+            if numpy.ndim(data) == 0:
+                data = numpy.full(len(self.data), data)
+            return self._with(data)
+        if compiled is not None:
+            return self._with(array("d", map(compiled, self.data)))
+
+        data = _zeros(len(self.data))
+        for i, x in enumerate(self.data):
+            value = function.call(interpreter, [float(x)])
+            if type(value) is not float:
+                raise NativeError("Vector elements must be numbers.")
+            data[i] = value
+        return self._with(data)
+
+    def _elementwise(self, op: Callable, other: object) -> LoxVector:
+        other = self._operand(other)
+        if numpy is not None:
+            return self._with(op(self.data, other))
+        if type(other) is float:
+            return self._with(array("d", [op(x, other) for x in self.data]))
+        return self._with(array("d", map(op, self.data, other)))
+
+    def _operand(self, other: object):
+        """The data of a vector as long as this one, or a number."""
+        if type(other) is float:
+            return other
+        if not isinstance(other, LoxVector):
+            raise NativeError("Operand must be a vector or a number.")
+        if len(other.data) != len(self.data):
+            raise NativeError("Vectors must have the same length.")
+        return other.data
+
+    def _with(self, data) -> LoxVector:
+        # the class's shape, as this one may have got fields
+        return LoxVector(self.klass.shape, data=data)
+
+    def _index(self, index: object) -> int:
+        if type(index) is not float or not index.is_integer():
+            raise NativeError("Index must be a whole number.")
+        if not 0 <= index < len(self.data):
+            raise NativeError("Index out of range.")
+        return int(index)
+
+    def _non_empty(self) -> None:
+        if not len(self.data):
+            raise NativeError("Vector is empty.")
+
+
+def vector_class(array_class: NativeClass) -> NativeClass:
+    def to_array(instance: LoxVector) -> LoxArray:
+        result = LoxArray(array_class.shape)
+        result.items = array("d", instance.data)
+        return result
+
+    methods = [
+        NativeMethod("get", 1, LoxVector.get_item),
+        NativeMethod("set", 2, LoxVector.set_item),
+        NativeMethod("length", 0, LoxVector.length),
+        NativeMethod("toArray", 0, to_array),
+        NativeMethod("add", 1, LoxVector.add),
+        NativeMethod("mul", 1, LoxVector.mul),
+        NativeMethod("dot", 1, LoxVector.dot),
+        NativeMethod("sum", 0, LoxVector.sum),
+        NativeMethod("min", 0, LoxVector.min),
+        NativeMethod("max", 0, LoxVector.max),
+        NativeMethod("map", 1, LoxVector.map, takes_interpreter=True),
+    ]
+    return NativeClass(
+        "Vector",
+        LoxVector,
+        {method.name: method for method in methods},
+        NativeMethod("init", 1, LoxVector.init),
+    )
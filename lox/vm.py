@@ -0,0 +1,336 @@
+from __future__ import annotations
+from attrs import define
+from .callable import LoxCallable, LoxClass, LoxFunction, LoxInstance
+from .compiler import Compiler, FunctionProto, OpCode
+from .environment import Environment, GlobalEnvironment
+from .error import LoxRuntimeError, NativeError
+from .interpreter import Interpreter
+from .rope import concat, is_string
+from .stmt import Stmt
+from .token import Token
+from .token_type import EOF
+
+# plain ints, so the dispatch loop compares small ints instead of enum members
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+DEFINE_LOCAL = OpCode.DEFINE_LOCAL.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+EQUAL = OpCode.EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+JUMP_IF_TRUE = OpCode.JUMP_IF_TRUE.value
+POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE.value
+PUSH_SCOPE = OpCode.PUSH_SCOPE.value
+POP_SCOPE = OpCode.POP_SCOPE.value
+CALL = OpCode.CALL.value
+CLOSURE = OpCode.CLOSURE.value
+CLASS = OpCode.CLASS.value
+RETURN = OpCode.RETURN.value
+
+
+@define
+class VMFunction(LoxFunction):
+    _proto: FunctionProto
+
+    def bind(self, instance: LoxInstance) -> VMFunction:
+        environment = Environment(self._closure, [instance])
+        return VMFunction(
+            self._declaration, environment, self._is_initializer, self._proto
+        )
+
+    def _execute(self, interpreter, environment: Environment) -> object:
+        # only reached when a native calls back into Lox; calls made by Lox
+        # code push a frame in the running dispatch loop instead
+        return interpreter.run(
+            self._proto,
+            environment,
+            environment.enclosing if self._is_initializer else None,
+        )
+
+
+@define
+class VM(Interpreter):
+    """Runs programs compiled to bytecode by the Compiler.
+
+    Lox calls push a frame onto an explicit frame stack instead of recursing
+    in Python, so the depth of Lox recursion is only limited by memory.
+    """
+
+    @classmethod
+    def prepare(cls, statements: list[Stmt]) -> FunctionProto:
+        return Compiler().compile(statements)
+
+    def interpret(self, statements: list[Stmt]) -> None:
+        self.run_prepared(self.prepare(statements))
+
+    def run_prepared(self, script: FunctionProto) -> None:
+        try:
+            self.run(script, self.global_env, None)
+        except LoxRuntimeError as e:
+            self.error_handler.runtime_error(e)
+
+    def _error(self, line: int, message: str) -> LoxRuntimeError:
+        # runtime errors only report the line, which comes from the line table
+        return LoxRuntimeError(Token(EOF, "", None, line), message)
+
+    def run(
+        self,
+        proto: FunctionProto,
+        env: Environment | GlobalEnvironment,
+        this_env: Environment | None,
+    ) -> object:
+        """Executes proto until it returns; this_env is set for initializers."""
+        globals = self.global_env.values
+        stringify = self.stringify
+        is_equal = self.is_equal
+        stdout = self.stdout
+
+        stack: list[object] = []
+        frames: list[tuple] = []
+        chunk = proto.chunk
+        code = chunk.code
+        constants = chunk.constants
+        lines = chunk.lines
+        ip = 0
+
+        while True:
+            op = code[ip]
+            ip += 1
+            if op == GET_LOCAL:
+                depth = code[ip]
+                scope = env
+                while depth:
+                    scope = scope.enclosing
+                    depth -= 1
+                stack.append(scope.values[code[ip + 1]])
+                ip += 2
+            elif op == CONSTANT:
+                stack.append(constants[code[ip]])
+                ip += 1
+            elif op == POP:
+                stack.pop()
+            elif op == GET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                try:
+                    stack.append(globals[name.lexeme])
+                except KeyError:
+                    raise LoxRuntimeError(
+                        name, f"Undefined variable '{name.lexeme}'."
+                    ) from None
+            elif op == POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP:
+                ip = code[ip]
+            elif op == SET_LOCAL:
+                depth = code[ip]
+                scope = env
+                while depth:
+                    scope = scope.enclosing
+                    depth -= 1
+                scope.values[code[ip + 1]] = stack[-1]
+                ip += 2
+            elif op == ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a + b
+                elif is_string(a) and is_string(b):
+                    stack[-1] = concat(a, b)
+                else:
+                    raise self._error(
+                        lines[ip - 1], "Operands must be two numbers or two strings."
+                    )
+            elif GREATER <= op <= LESS_EQUAL or SUBTRACT <= op <= DIVIDE:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise self._error(lines[ip - 1], "Operands must be numbers.")
+                if op == LESS:
+                    stack[-1] = a < b
+                elif op == SUBTRACT:
+                    stack[-1] = a - b
+                elif op == MULTIPLY:
+                    stack[-1] = a * b
+                elif op == GREATER:
+                    stack[-1] = a > b
+                elif op == LESS_EQUAL:
+                    stack[-1] = a <= b
+                elif op == GREATER_EQUAL:
+                    stack[-1] = a >= b
+                else:
+                    stack[-1] = a / b
+            elif op == CALL:
+                argc = code[ip]
+                ip += 1
+                arguments = stack[len(stack) - argc :]
+                callee = stack[-argc - 1]
+                del stack[-argc - 1 :]
+                if isinstance(callee, VMFunction):
+                    if argc != callee.arity():
+                        raise self._error(
+                            lines[ip - 1],
+                            f"Expected {callee.arity()} arguments but got {argc}."
+                        )
+                    frames.append((code, constants, lines, ip, env, this_env))
+                    chunk = callee._proto.chunk
+                    code = chunk.code
+                    constants = chunk.constants
+                    lines = chunk.lines
+                    ip = 0
+                    env = Environment(callee._closure, arguments)
+                    this_env = callee._closure if callee._is_initializer else None
+                elif isinstance(callee, LoxClass):
+                    if argc != callee.arity():
+                        raise self._error(
+                            lines[ip - 1],
+                            f"Expected {callee.arity()} arguments but got {argc}."
+                        )
+                    instance = LoxInstance(callee.shape)
+                    initializer = callee.find_method("init")
+                    if initializer is None:
+                        stack.append(instance)
+                        continue
+                    initializer = initializer.bind(instance)
+                    frames.append((code, constants, lines, ip, env, this_env))
+                    chunk = initializer._proto.chunk
+                    code = chunk.code
+                    constants = chunk.constants
+                    lines = chunk.lines
+                    ip = 0
+                    env = Environment(initializer._closure, arguments)
+                    this_env = initializer._closure
+                elif isinstance(callee, LoxCallable):
+                    if argc != callee.arity():
+                        raise self._error(
+                            lines[ip - 1],
+                            f"Expected {callee.arity()} arguments but got {argc}."
+                        )
+                    try:
+                        stack.append(callee.call(self, arguments))
+                    except NativeError as e:
+                        raise self._error(lines[ip - 1], e.message) from None
+                else:
+                    raise self._error(
+                        lines[ip - 1], "Can only call functions and classes."
+                    )
+            elif op == RETURN:
+                result = stack.pop()
+                if this_env is not None:
+                    result = this_env.values[0]
+                if not frames:
+                    return result
+                code, constants, lines, ip, env, this_env = frames.pop()
+                stack.append(result)
+            elif op == PUSH_SCOPE:
+                env = Environment(env)
+            elif op == POP_SCOPE:
+                env = env.enclosing
+            elif op == NIL:
+                stack.append(None)
+            elif op == TRUE:
+                stack.append(True)
+            elif op == FALSE:
+                stack.append(False)
+            elif op == EQUAL:
+                b = stack.pop()
+                stack[-1] = is_equal(stack[-1], b)
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise self._error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = -value
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += 1
+                else:
+                    ip = code[ip]
+            elif op == GET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have properties.")
+                stack[-1] = instance.get(name)
+            elif op == SET_PROPERTY:
+                name = constants[code[ip]]
+                ip += 1
+                value = stack.pop()
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    raise LoxRuntimeError(name, "Only instances have fields.")
+                instance.set(name, value)
+                stack[-1] = value
+            elif op == SET_GLOBAL:
+                name = constants[code[ip]]
+                ip += 1
+                if name.lexeme not in globals:
+                    raise LoxRuntimeError(
+                        name, f"Undefined variable '{name.lexeme}'."
+                    )
+                globals[name.lexeme] = stack[-1]
+            elif op == DEFINE_LOCAL:
+                env.define(code[ip], stack.pop())
+                ip += 1
+            elif op == DEFINE_GLOBAL:
+                globals[constants[code[ip]].lexeme] = stack.pop()
+                ip += 1
+            elif op == PRINT:
+                print(stringify(stack.pop()), file=stdout)
+            elif op == CLOSURE:
+                function_proto = constants[code[ip]]
+                ip += 1
+                stack.append(
+                    VMFunction(
+                        function_proto.declaration,
+                        env,
+                        function_proto.is_initializer,
+                        function_proto,
+                    )
+                )
+            elif op == CLASS:
+                name = constants[code[ip]]
+                count = code[ip + 1]
+                ip += 2
+                methods: dict[str, LoxFunction] = {}
+                if count:
+                    for method in stack[-count:]:
+                        methods[method._proto.name] = method
+                    del stack[-count:]
+                stack.append(LoxClass(name.lexeme, methods))
+            else:
+                raise AssertionError(f"unknown opcode {op}")
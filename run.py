@@ -1,43 +1,194 @@
 #!/usr/bin/env python3
 import argparse
+import io
+import multiprocessing
 import sys
-from lox.error import error_handler
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from lox import cache
+from lox.closure_compiler import ClosureInterpreter
+from lox.error import ErrorHandler
 from lox.interpreter import Interpreter
+from lox.optimizer import Pipeline
 from lox.resolver import Resolver
 from lox.parser import Parser
+from lox.profiler import ProfilingInterpreter, Sampler
 from lox.scanner import Scanner
+from lox.stmt import Stmt
+from lox.transpiler import TranspilingInterpreter
+from lox.vm import VM
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VM,
+    "python": TranspilingInterpreter,
+}
 
 interpreter = Interpreter.with_time()
+optimize = 1
+pipeline = Pipeline.for_level(optimize)
+use_cache = True
+stream = False
+# set up by init_worker for batches
+engine_name = "tree"
+memoize = 0
 
 
-def run(source: str) -> None:
-    scanner = Scanner(source)
-    tokens = scanner.scan_tokens()
-    parser = Parser(tokens)
+def compile_source(source: str, error_handler: ErrorHandler) -> list[Stmt] | None:
+    """Scans, parses, resolves and optimises source; None on errors."""
+    scanner = Scanner(source, error_handler=error_handler)
+    parser = Parser(scanner.iter_tokens(), error_handler)
     statements = parser.parse()
     if error_handler.had_error:
-        return
+        return None
 
-    resolver = Resolver(interpreter)
+    resolver = Resolver(error_handler)
     resolver.resolve([s for s in statements if s is not None])
     if error_handler.had_error:
-        return
+        return None
+
+    return pipeline.run([s for s in statements if s is not None], error_handler)
 
-    interpreter.interpret([s for s in statements if s is not None])
+
+def run_stream(source: str) -> None:
+    """Runs every top-level declaration as soon as it has been parsed.
+
+    Output starts before the rest of the source is parsed, and no more than
+    one declaration is kept around at a time. After the first error the
+    remaining source is only checked for syntax errors.
+    """
+    error_handler = interpreter.error_handler
+    scanner = Scanner(source, error_handler=error_handler)
+    parser = Parser(scanner.iter_tokens(), error_handler)
+    for statement in parser.declarations():
+        if error_handler.had_error or error_handler.had_runtime_error:
+            continue
+        Resolver(error_handler).resolve([statement])
+        if error_handler.had_error:
+            continue
+        interpreter.interpret(pipeline.run([statement], error_handler))
+
+
+def run(source: str, filename: str | None = None) -> None:
+    if stream:
+        run_stream(source)
+        return
+    statements = None
+    if filename is not None and use_cache:
+        statements = cache.load(filename, source, optimize)
+    if statements is None:
+        statements = compile_source(source, interpreter.error_handler)
+        if statements is None:
+            return
+        if filename is not None and use_cache:
+            cache.store(filename, source, optimize, statements)
+    interpreter.interpret(statements)
 
 
 def run_file(filename: str) -> None:
     try:
         with open(filename, "r") as file:
-            run(file.read())
-        if error_handler.had_error:
+            run(file.read(), filename)
+        if interpreter.error_handler.had_error:
             sys.exit(65)
-        if error_handler.had_runtime_error:
+        if interpreter.error_handler.had_runtime_error:
             sys.exit(70)
     except FileNotFoundError as e:
         print(f"could not open {filename}: {e}")
 
 
+def init_worker(
+    engine: str, memo_size: int, level: int, cache_enabled: bool, streaming: bool
+) -> None:
+    """Sets up a process that runs the scripts of a batch."""
+    global engine_name, memoize, optimize, pipeline, use_cache, stream
+    engine_name = engine
+    memoize = memo_size
+    optimize = level
+    pipeline = Pipeline.for_level(optimize)
+    use_cache = cache_enabled
+    stream = streaming
+
+
+def run_script(filename: str) -> tuple[str, int, float, str, str]:
+    """Runs one script of a batch on a fresh interpreter.
+
+    Returns the filename, the exit code run_file would have exited with, the
+    seconds taken and what the script wrote to stdout and stderr.
+    """
+    global interpreter
+    interpreter = ENGINES[engine_name].with_time()
+    interpreter.memo_size = memoize
+    stdout, stderr = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            with open(filename, "r") as file:
+                run(file.read(), filename)
+            if interpreter.error_handler.had_error:
+                status = 65
+            elif interpreter.error_handler.had_runtime_error:
+                status = 70
+            else:
+                status = 0
+        except OSError as e:
+            print(f"could not open {filename}: {e}")
+            status = 66
+        except Exception:
+            # one broken script shouldn't take the rest of the batch down
+            traceback.print_exc()
+            status = 70
+    elapsed = time.perf_counter() - start
+    return filename, status, elapsed, stdout.getvalue(), stderr.getvalue()
+
+
+def run_batch(filenames: list[str], jobs: int, worker_args: tuple) -> int:
+    """Runs every script on a pool of jobs processes; the highest exit code.
+
+    Output is printed a script at a time, in the order of filenames, each
+    followed by its exit code and time on stderr.
+    """
+    start = time.perf_counter()
+    if jobs == 1:
+        init_worker(*worker_args)
+        results = map(run_script, filenames)
+    else:
+        pool = multiprocessing.Pool(jobs, init_worker, worker_args)
+        chunksize = max(1, len(filenames) // (jobs * 4))
+        results = pool.imap(run_script, filenames, chunksize)
+
+    counts: dict[int, int] = {}
+    total = 0.0
+    for filename, status, elapsed, out, err in results:
+        sys.stdout.write(out)
+        sys.stdout.flush()
+        sys.stderr.write(err)
+        print(f"{status:>3} {elapsed:9.3f}s  {filename}", file=sys.stderr)
+        counts[status] = counts.get(status, 0) + 1
+        total += elapsed
+    if jobs != 1:
+        pool.close()
+        pool.join()
+
+    wall = time.perf_counter() - start
+    statuses = ", ".join(f"{n} exited {code}" for code, n in sorted(counts.items()))
+    print(
+        f"{len(filenames)} scripts ({statuses}) in {wall:.3f}s, "
+        f"{total:.3f}s spent in scripts on {jobs} jobs",
+        file=sys.stderr,
+    )
+    return max(counts, default=0)
+
+
+def read_manifest(filename: str) -> list[str]:
+    """The script names in a manifest, one per line; # starts a comment."""
+    with open(filename, "r") as file:
+        lines = [line.split("#", 1)[0].strip() for line in file]
+    return [line for line in lines if line]
+
+
 def runPrompt():
     while True:
         print("> ", end="")
@@ -46,19 +197,128 @@ def runPrompt():
         except EOFError:
             break
         run(line)
-        error_handler.reset()
+        interpreter.error_handler.reset()
+
+
+def report_memos() -> None:
+    for function, cache in interpreter.memos.items():
+        name = f"{function.name.lexeme}:{function.name.line}"
+        print(f"{cache.hits:>8} hits {cache.misses:>8} misses  {name}", file=sys.stderr)
 
 
 parser = argparse.ArgumentParser(description="lox interpreter")
-parser.add_argument("filename", nargs="?")
+parser.add_argument("filenames", metavar="filename", nargs="*")
+parser.add_argument(
+    "--engine",
+    choices=ENGINES,
+    default="tree",
+    help="tree-walking interpreter, compiled closures, bytecode VM or Python source",
+)
+parser.add_argument(
+    "-O",
+    dest="optimize",
+    type=int,
+    choices=[0, 1],
+    default=1,
+    help="optimisation level: -O0 runs the program as parsed",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help=f"neither read nor write compiled programs in {cache.DIRECTORY}",
+)
+parser.add_argument(
+    "--stream",
+    action="store_true",
+    help="run each top-level declaration as soon as it is parsed",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="time every call and print a report to stderr when done",
+)
+parser.add_argument(
+    "--collapsed",
+    metavar="FILE",
+    help="profile and write collapsed stacks for flame graphs to FILE",
+)
+parser.add_argument(
+    "--memoize",
+    metavar="SIZE",
+    type=int,
+    default=0,
+    help="remember the last SIZE results of each pure function (tree engine)",
+)
+parser.add_argument(
+    "--memo-stats",
+    action="store_true",
+    help="print cache hits and misses of pure functions to stderr when done",
+)
+parser.add_argument(
+    "--manifest",
+    metavar="FILE",
+    help="also run the scripts listed in FILE, one per line",
+)
+parser.add_argument(
+    "--jobs",
+    metavar="N",
+    type=int,
+    help="run the scripts on N processes and report exit codes and times",
+)
+parser.add_argument(
+    "--sample",
+    action="store_true",
+    help="sample the running line every few ms instead of timing every call",
+)
 
 
 def main():
-    args = parser.parse_args()
-    if args.filename is not None:
-        run_file(args.filename)
-    else:
-        runPrompt()
+    global interpreter, optimize, pipeline, use_cache, stream
+    args = parser.parse_intermixed_args()
+    optimize = args.optimize
+    pipeline = Pipeline.for_level(optimize)
+    use_cache = not args.no_cache
+    stream = args.stream
+    profiling = args.profile or args.sample or args.collapsed is not None
+    filenames = args.filenames
+    if args.manifest is not None:
+        filenames += read_manifest(args.manifest)
+    if len(filenames) > 1 or args.manifest is not None or args.jobs is not None:
+        if profiling or args.memo_stats:
+            parser.error("profiling and --memo-stats need a single script")
+        jobs = args.jobs or 1
+        if jobs < 1:
+            parser.error("--jobs must be at least 1")
+        worker_args = (args.engine, args.memoize, optimize, use_cache, stream)
+        sys.exit(run_batch(filenames, jobs, worker_args))
+    if profiling and args.engine != "tree":
+        parser.error("profiling needs --engine tree")
+    if profiling and not args.sample:
+        interpreter = ProfilingInterpreter.with_time()
+    elif args.engine != "tree":
+        interpreter = ENGINES[args.engine].with_time()
+    interpreter.memo_size = args.memoize
+    profiler = None
+    if args.sample:
+        profiler = Sampler()
+        profiler.start()
+    elif profiling:
+        profiler = interpreter.profiler
+    try:
+        if filenames:
+            run_file(filenames[0])
+        else:
+            runPrompt()
+    finally:
+        if args.sample:
+            profiler.stop()
+        if args.memo_stats:
+            report_memos()
+        if args.profile or args.sample:
+            profiler.report(sys.stderr)
+        if args.collapsed is not None:
+            with open(args.collapsed, "w") as file:
+                profiler.write_collapsed(file)
 
 
 if __name__ == "__main__":
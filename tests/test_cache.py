@@ -0,0 +1,34 @@
+from lox import cache
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.stmt import Print
+
+
+def compile(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    return statements
+
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / "script.lox")
+    source = "{ var a = 1; print a; }"
+    assert cache.load(filename, source, 1) is None
+
+    cache.store(filename, source, 1, compile(source))
+    [block] = cache.load(filename, source, 1)
+    declaration, statement = block.statements
+    assert declaration.slot == 0
+    assert isinstance(statement, Print)
+    assert (statement.expression.depth, statement.expression.slot) == (0, 0)
+
+
+def test_stale_entries_are_ignored(tmp_path):
+    filename = str(tmp_path / "script.lox")
+    cache.store(filename, "print 1;", 1, compile("print 1;"))
+    assert cache.load(filename, "print 2;", 1) is None
+    assert cache.load(filename, "print 1;", 0) is None
+
+    cache.cache_path(filename, 1).write_bytes(b"garbage")
+    assert cache.load(filename, "print 1;", 1) is None
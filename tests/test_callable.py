@@ -0,0 +1,67 @@
+from lox.callable import LoxClass, LoxInstance, LRUCache
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.token import Token
+from lox.token_type import IDENTIFIER
+
+
+def name(lexeme):
+    return Token(IDENTIFIER, lexeme, None, 1)
+
+
+def test_instances_share_shapes():
+    klass = LoxClass("Point", {})
+    a, b, c = (LoxInstance(klass.shape) for _ in range(3))
+    for instance in (a, b):
+        instance.set(name("x"), 1.0)
+        instance.set(name("y"), 2.0)
+    c.set(name("y"), 3.0)
+    c.set(name("x"), 4.0)
+
+    assert a.shape is b.shape
+    assert a.shape is not c.shape
+    assert a.shape.slots == {"x": 0, "y": 1}
+    assert c.values == [3.0, 4.0]
+    assert c.get(name("x")) == 4.0
+
+    a.set(name("x"), 5.0)
+    assert a.values == [5.0, 2.0]
+    assert a.shape is b.shape
+
+
+def test_memoized_pure_functions(capsys):
+    statements = Parser(
+        Scanner(
+            """
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+fun same(x) { return x; }
+print fib(30);
+print same(1) == same(true);
+print same(same) == same;
+print same(0);
+print same(-0);
+"""
+        ).scan_tokens()
+    ).parse()
+    Resolver().resolve(statements)
+    interpreter = Interpreter(memo_size=100)
+    interpreter.interpret(statements)
+
+    assert capsys.readouterr().out == "832040\nfalse\ntrue\n0\n-0\n"
+    fib, same = (interpreter.memos[s] for s in statements[:2])
+    assert (fib.hits, fib.misses) == (28, 31)
+    # functions can't be hashed and are called without the cache
+    assert (same.hits, same.misses) == (0, 4)
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put((1,), "a")
+    cache.put((2,), "b")
+    assert cache.get((1,)) == "a"
+    cache.put((3,), "c")
+    assert cache.get((2,)) is None
+    assert cache.get((1,)) == "a"
+    assert (cache.hits, cache.misses) == (2, 1)
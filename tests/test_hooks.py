@@ -0,0 +1,64 @@
+import pytest
+
+from lox.callable import LoxInstance
+from lox.closure_compiler import ClosureInterpreter
+from lox.interpreter import HookedInterpreter, Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.transpiler import TranspilingInterpreter
+from lox.vm import VM
+
+
+def parse(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    return statements
+
+
+def test_hooks_see_calls_instances_and_statements(capsys):
+    statements = parse(
+        """
+class Box {
+  init(value) { this.value = value; }
+  get() { return this.value; }
+}
+fun twice(x) { return x * 2; }
+print Box(twice(2)).get();
+"""
+    )
+    interpreter = Interpreter()
+    events = []
+    interpreter.add_hook("statement", lambda stmt: events.append(type(stmt).__name__))
+    interpreter.add_hook("enter", lambda f, args: events.append(("enter", str(f))))
+    interpreter.add_hook("exit", lambda f, value: events.append(("exit", value)))
+    interpreter.add_hook("instance", lambda i: events.append(str(i)))
+    assert type(interpreter) is HookedInterpreter
+
+    interpreter.interpret(statements)
+
+    assert capsys.readouterr().out == "4\n"
+    assert events[:3] == ["Class", "Function", "Print"]
+    assert events[3:6] == [("enter", "<fn twice>"), "Return", ("exit", 4.0)]
+    assert events[6:9] == [("enter", "Box"), "Expression", "Box instance"]
+    assert events[9][0] == "exit" and isinstance(events[9][1], LoxInstance)
+    assert events[10:] == [("enter", "<fn get>"), "Return", ("exit", 4.0)]
+
+
+def test_error_hook(capsys):
+    interpreter = Interpreter()
+    errors = []
+    interpreter.add_hook("error", errors.append)
+    interpreter.interpret(parse('print -"a";'))
+    assert [e.message for e in errors] == ["Operand must be a number."]
+    assert interpreter.error_handler.had_runtime_error
+
+
+def test_hooks_need_tree_interpreter():
+    interpreter = Interpreter()
+    with pytest.raises(ValueError):
+        interpreter.add_hook("teardown", print)
+    assert type(interpreter) is Interpreter
+    for engine in [ClosureInterpreter, VM, TranspilingInterpreter]:
+        with pytest.raises(TypeError, match=f"{engine.__name__} does not run hooks"):
+            engine().add_hook("statement", print)
@@ -0,0 +1,333 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lox.closure_compiler import ClosureInterpreter
+from lox.error import ErrorHandler
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.transpiler import TranspilingInterpreter
+from lox.vm import VM
+
+
+@pytest.fixture(params=[Interpreter, ClosureInterpreter, VM, TranspilingInterpreter])
+def run(request):
+    def run(source, error_handler=None):
+        error_handler = error_handler or ErrorHandler()
+        scanner = Scanner(source, error_handler=error_handler)
+        statements = Parser(scanner.scan_tokens(), error_handler).parse()
+        if not error_handler.had_error:
+            Resolver(error_handler).resolve(statements)
+        if not error_handler.had_error:
+            interpreter = request.param.with_time(error_handler=error_handler)
+            interpreter.interpret(statements)
+        return error_handler
+
+    return run
+
+
+def test_block_scopes(run, capsys):
+    run(
+        """
+var a = "global";
+{
+  var a = 1;
+  { var b = a + 1; print b; var a = 10; print a; }
+  print a;
+}
+print a;
+"""
+    )
+    assert capsys.readouterr().out == "2\n10\n1\nglobal\n"
+
+
+def test_closures_capture_slots(run, capsys):
+    run(
+        """
+fun makeCounter() {
+  var i = 0;
+  fun count() { i = i + 1; return i; }
+  return count;
+}
+var c = makeCounter();
+c();
+print c();
+for (var i = 0; i < 2; i = i + 1) { var sq = i * i; print sq; }
+"""
+    )
+    assert capsys.readouterr().out == "2\n0\n1\n"
+
+
+def test_classes(run, capsys):
+    run(
+        """
+{
+  class Point {
+    init(x, y) { this.x = x; this.y = y; }
+    sum() { return this.x + this.y; }
+    self() { return Point; }
+  }
+  var p = Point(1, 2);
+  print p.sum();
+  print p.self();
+}
+"""
+    )
+    assert capsys.readouterr().out == "3\nPoint\n"
+
+
+def test_runtime_error(run, capsys):
+    assert run('print 1 + "a";').had_runtime_error
+    assert capsys.readouterr().err == (
+        "Operands must be two numbers or two strings.\n[line 1]\n"
+    )
+
+
+def test_deeply_nested_loops(run, capsys):
+    # more blocks than CPython nests in one function
+    loops = "".join(f"for (var i = {n}; i < {n + 1}; i = i + 1) " for n in range(22))
+    run(f"var count = 0; {loops} count = count + i; print count;")
+    assert capsys.readouterr().out == "21\n"
+
+
+def test_concurrent_runs_keep_their_errors(run):
+    sources = ["var a = 1;", 'var a = -"a";', "var a = ;", "var a = a;"] * 8
+
+    def diagnose(source):
+        error_handler = run(source, ErrorHandler(file=io.StringIO()))
+        return error_handler.had_error, error_handler.had_runtime_error
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(diagnose, sources))
+    assert results == [
+        (False, False),
+        (False, True),
+        (True, False),
+        (False, True),
+    ] * 8
+
+
+def test_assign_call_result_to_local(run, capsys):
+    run(
+        """
+fun inc(x) { return x + 1; }
+fun f() { var a = 0; a = inc(a); print a; }
+f();
+"""
+    )
+    assert capsys.readouterr().out == "1\n"
+
+
+def test_runtime_error_aborts_program(run, capsys):
+    run(
+        """
+fun f(a) { return a; }
+print "before";
+f(1, 2);
+print "after";
+"""
+    )
+    captured = capsys.readouterr()
+    assert captured.out == "before\n"
+    assert captured.err == "Expected 1 arguments but got 2.\n[line 4]\n"
+
+
+def test_return_from_nested_loops(run, capsys):
+    run(
+        """
+fun find(limit) {
+  for (var i = 0; i < limit; i = i + 1) {
+    while (true) {
+      if (i == 3) return i;
+      i = i + 1;
+    }
+  }
+  return nil;
+}
+print find(10);
+print find(0) == nil;
+"""
+    )
+    assert capsys.readouterr().out == "3\ntrue\n"
+
+
+def test_loop_closures_capture_each_iteration(run, capsys):
+    run(
+        """
+var first;
+var last;
+for (var i = 0; i < 3; i = i + 1) {
+  var j = i;
+  fun f() { j = j + 10; return j; }
+  if (i == 0) first = f;
+  last = f;
+}
+print first();
+print last();
+print first();
+"""
+    )
+    assert capsys.readouterr().out == "10\n12\n20\n"
+
+
+def test_undefined_global_assignment(run, capsys):
+    run("fun f() { missing = 1; }\nf();")
+    assert capsys.readouterr().err == "Undefined variable 'missing'.\n[line 1]\n"
+
+
+def test_method_calls_through_one_call_site(run, capsys):
+    run(
+        """
+class A { name() { return "A"; } }
+class B { name() { return "B"; } }
+fun shout() { return "field"; }
+var a = A();
+var b = B();
+for (var i = 0; i < 4; i = i + 1) {
+  var o = a;
+  if (i == 1) o = b;
+  if (i == 3) { o = B(); o.name = shout; }
+  print o.name();
+}
+var bound = a.name;
+print bound();
+"""
+    )
+    assert capsys.readouterr().out == "A\nB\nA\nfield\nA\n"
+
+
+def test_plus_after_specialising(run, capsys):
+    run(
+        """
+fun add(a, b) { return a + b; }
+print add(1, 2);
+print add("a", "b");
+print add(1, "b");
+"""
+    )
+    captured = capsys.readouterr()
+    assert captured.out == "3\nab\n"
+    assert captured.err == "Operands must be two numbers or two strings.\n[line 2]\n"
+
+
+@pytest.mark.parametrize("engine", [Interpreter, ClosureInterpreter, VM])
+def test_tail_calls_run_in_constant_stack(engine, capsys):
+    statements = Parser(
+        Scanner(
+            """
+fun even(n) { if (n == 0) return true; return odd(n - 1); }
+fun odd(n) { if (n == 0) return false; return even(n - 1); }
+class Counter {
+  count(n, total) { if (n == 0) return total; return this.count(n - 1, total + 1); }
+}
+print even(20001);
+print Counter().count(20000, 0);
+"""
+        ).scan_tokens()
+    ).parse()
+    Resolver().resolve(statements)
+    engine().interpret(statements)
+    assert capsys.readouterr().out == "false\n20000\n"
+
+
+def test_long_strings(run, capsys):
+    run(
+        """
+var s = "";
+for (var i = 0; i < 300; i = i + 1) s = s + "abcd";
+var a = s + "a";
+var b = s + "b";
+var c = s + "a";
+print a == c;
+print a == b;
+print a == s;
+print "x" + a == "x" + c;
+var t = "";
+for (var i = 0; i < 1200; i = i + 1) t = t + "abcd";
+print t == s + s + s + s;
+print s;
+"""
+    )
+    out = capsys.readouterr().out
+    assert out == "true\nfalse\nfalse\ntrue\ntrue\n" + "abcd" * 300 + "\n"
+
+
+def test_array_and_map(run, capsys):
+    run(
+        """
+var a = Array();
+for (var i = 0; i < 4; i = i + 1) a.push(i * i);
+a.set(0, "zero");
+var push = a.push;
+push("last");
+print a.get(0) + " " + a.pop();
+print a.length();
+var m = Map();
+m.set(1, "number");
+m.set(true, "bool");
+m.set(a, "array");
+m.set("a" + "b", "string");
+print m.get(1) + m.get(true) + m.get(a) + m.get("ab");
+print m.get(Array()) == nil and !m.has(2);
+print m.remove(1);
+print m.size();
+"""
+    )
+    assert capsys.readouterr().out == (
+        "zero last\n4\nnumberboolarraystring\ntrue\nnumber\n3\n"
+    )
+
+
+def test_vector(run, capsys):
+    run(
+        """
+var v = Vector(5);
+for (var i = 0; i < 5; i = i + 1) v.set(i, i);
+fun double(x) { return 2 * x + 1; }
+fun clamp(x) { if (x > 2) return 2; return x; }
+var w = v.map(double);
+print w.get(4);
+print v.map(clamp).sum();
+print v.add(w).dot(v);
+print v.mul(3).max() + v.add(1).min();
+print w.toArray().get(2) + v.length();
+"""
+    )
+    assert capsys.readouterr().out == "9\n7\n100\n13\n10\n"
+
+
+def test_natives_compare_by_identity(run, capsys):
+    run(
+        """
+print Array == Array;
+print Array == Map;
+print clock == clock;
+var push = Array().push;
+print push == push;
+print Array() == Array();
+"""
+    )
+    assert capsys.readouterr().out == "true\nfalse\ntrue\ntrue\nfalse\n"
+
+
+@pytest.mark.parametrize(
+    "source,error",
+    [
+        ("Array().pop();", "Can't pop from an empty array."),
+        ("var a = Array(); a.push(1); a.get(1);", "Index out of range."),
+        ("Array().set(0.5, 1);", "Index must be a whole number."),
+        ("Map().keys(1);", "Expected 0 arguments but got 1."),
+        ("Array().first();", "Undefined property 'first'."),
+        ("Vector(-1);", "Size must be a whole number."),
+        ("Vector(2).set(0, nil);", "Vector elements must be numbers."),
+        ("Vector(2).add(Vector(3));", "Vectors must have the same length."),
+        ("Vector(0).max();", "Vector is empty."),
+        ("fun f(x) {} Vector(1).map(f);", "Vector elements must be numbers."),
+    ],
+)
+def test_array_errors(run, capsys, source, error):
+    run(source)
+    assert capsys.readouterr().err == f"{error}\n[line 1]\n"
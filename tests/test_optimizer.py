@@ -0,0 +1,62 @@
+from lox.error import ErrorHandler
+from lox.expr import *
+from lox.optimizer import Pipeline
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.stmt import *
+
+
+def optimize(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    return Pipeline.for_level(1).run(statements, ErrorHandler())
+
+
+def test_constant_folding():
+    [statement] = optimize('print -(1 + 2) * 3 == -9 and !nil and "a" + "b";')
+    assert isinstance(statement.expression, Literal)
+    assert statement.expression.value == "ab"
+
+
+def test_failing_operations_are_not_folded():
+    [statement] = optimize('print 1 + "a";')
+    assert isinstance(statement.expression, Binary)
+
+
+def test_dead_code_elimination():
+    [function] = optimize(
+        """
+fun f() {
+  if (false) print "dead";
+  if (1 < 2) return 1; else return 2;
+  print "unreachable";
+}
+"""
+    )
+    [statement] = function.body
+    assert isinstance(statement, Return)
+    assert statement.value.value == 1.0
+
+
+def test_for_body_is_merged_with_increment():
+    [function] = optimize(
+        "fun f() { for (var i = 0; i < 3; i = i + 1) { var j = i; print j; } }"
+    )
+    [loop] = function.body[0].statements[1:]
+    assert [type(s) for s in loop.body.statements] == [Var, Print, Expression]
+    increment = loop.body.statements[-1].expression
+    assert (increment.depth, increment.slot) == (1, 0)
+
+
+def test_shadowing_for_body_is_not_merged():
+    [loop] = optimize(
+        "for (var i = 0; i < 3; i = i + 1) { var i = 10; print i; }"
+    )[0].statements[1:]
+    assert [type(s) for s in loop.body.statements] == [Block, Expression]
+
+
+def test_level_zero_keeps_program():
+    statements = Parser(Scanner("print (1 + 2);").scan_tokens()).parse()
+    assert Pipeline.for_level(0).run(statements, ErrorHandler()) == statements
+    assert isinstance(statements[0].expression, Grouping)
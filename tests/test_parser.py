@@ -0,0 +1,23 @@
+from lox.parser import Parser
+from lox.scanner import Scanner
+from lox.stmt import *
+
+
+def test_declarations_are_parsed_lazily():
+    consumed = []
+
+    def tokens():
+        for token in Scanner("var a = 1; print a; fun f() {}").iter_tokens():
+            consumed.append(token)
+            yield token
+
+    declarations = Parser(tokens()).declarations()
+    assert isinstance(next(declarations), Var)
+    # one token of lookahead past the declaration
+    assert [token.lexeme for token in consumed][-2:] == [";", "print"]
+    assert [type(d) for d in declarations] == [Print, Function]
+
+
+def test_parse_accepts_token_list():
+    statements = Parser(Scanner("print 1; print 2;").scan_tokens()).parse()
+    assert [type(s) for s in statements] == [Print, Print]
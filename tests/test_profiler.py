@@ -0,0 +1,113 @@
+import io
+import sys
+
+from attrs import define
+
+from lox.callable import LoxCallable
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.profiler import ProfilingInterpreter, Sampler
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+
+
+def profile(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    interpreter = ProfilingInterpreter.with_time()
+    interpreter.interpret(statements)
+    return interpreter.profiler
+
+
+def test_counts_calls_and_edges(capsys):
+    profiler = profile(
+        """
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+class Box {
+  init(value) { this.value = value; }
+  get() { return this.value; }
+}
+fun last(n) { if (n == 0) return clock(); return last(n - 1); }
+print Box(fib(5)).get();
+last(3);
+"""
+    )
+    assert capsys.readouterr().out == "5\n"
+    stats = profiler.stats
+    assert stats["fib:2"].calls == 15
+    assert stats["Box"].calls == 1
+    assert stats["Box.get:5"].calls == 1
+    # tail calls are still counted one by one
+    assert stats["last:7"].calls == 4
+    assert stats["clock"].calls == 1
+    assert profiler.edges[("fib:2", "fib:2")] == 14
+    assert profiler.edges[("<script>", "Box")] == 1
+    assert profiler.edges[("last:7", "clock")] == 1
+
+    script = stats["<script>"]
+    assert script.inclusive >= sum(s.exclusive for s in stats.values())
+    assert stats["fib:2"].inclusive <= script.inclusive
+
+
+def test_native_methods_by_class_and_name():
+    stats = profile(
+        """
+var a = Array();
+var push = a.push;
+for (var i = 0; i < 3; i = i + 1) push(i);
+a.get(0);
+Map().set(1, a.length());
+"""
+    ).stats
+    assert stats["Array"].calls == 1
+    assert stats["Array.push"].calls == 3
+    assert stats["Array.get"].calls == 1
+    assert stats["Array.length"].calls == 1
+    assert stats["Map.set"].calls == 1
+
+
+def test_collapsed_stacks():
+    profiler = profile("fun f() { var i = 0; while (i < 2000) i = i + 1; } f();")
+    out = io.StringIO()
+    profiler.write_collapsed(out)
+    stacks = dict(line.rsplit(" ", 1) for line in out.getvalue().splitlines())
+    assert "<script>;f:1" in stacks
+
+
+def test_sampler_finds_line_and_stack(capsys):
+    sampler = Sampler()
+
+    @define
+    class Sample(LoxCallable):
+        def arity(self):
+            return 0
+
+        def call(self, interpreter, arguments):
+            sampler.sample(sys._getframe())
+
+    statements = Parser(
+        Scanner(
+            """
+class Point {
+  init() {
+    while (true) {
+      print 1;
+      return sample();
+    }
+  }
+}
+fun make() {
+  return Point();
+}
+make();
+"""
+        ).scan_tokens()
+    ).parse()
+    Resolver().resolve(statements)
+    interpreter = Interpreter()
+    interpreter.global_env.define("sample", Sample())
+    interpreter.interpret(statements)
+
+    assert sampler.samples == 1
+    assert sampler.lines == {6: 1}
+    assert sampler.stacks == {("<script>", "make:10", "Point", "init:3", "line 6"): 1}
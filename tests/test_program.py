@@ -0,0 +1,97 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import lox
+from lox.closure_compiler import ClosureCompiler, ClosureInterpreter
+from lox.compiler import Compiler
+from lox.interpreter import Interpreter
+from lox.transpiler import Transpiler, TranspilingInterpreter
+from lox.vm import VM
+
+ENGINES = [Interpreter, ClosureInterpreter, VM, TranspilingInterpreter]
+
+RULE = """
+var total = 0;
+for (var i = 0; i < prices.length(); i = i + 1) {
+  total = total + prices.get(i);
+}
+var label = name + ": " + fee(total);
+print label;
+"""
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_run_with_values(engine):
+    program = lox.compile(RULE, engine=engine)
+    stdout = io.StringIO()
+    result = program.run(
+        {"prices": [1, 2.5], "name": "cart", "fee": lambda total: f"{total * 2:g}"},
+        stdout=stdout,
+    )
+    assert stdout.getvalue() == "cart: 7\n"
+    assert result["total"] == 3.5
+    assert result["label"] == "cart: 7"
+    assert result["prices"] == [1.0, 2.5]
+    assert "clock" not in result and "Array" not in result
+
+
+@pytest.mark.parametrize(
+    "engine, compiler, method",
+    [
+        (ClosureInterpreter, ClosureCompiler, "compile"),
+        (VM, Compiler, "compile"),
+        (TranspilingInterpreter, Transpiler, "transpile"),
+    ],
+)
+def test_runs_do_not_compile(engine, compiler, method, monkeypatch):
+    calls = []
+    compile = getattr(compiler, method)
+
+    def counting(self, statements):
+        calls.append(statements)
+        return compile(self, statements)
+
+    monkeypatch.setattr(compiler, method, counting)
+    program = lox.compile(RULE, engine=engine)
+    assert calls
+    calls.clear()
+    globals = {"prices": [1], "name": "cart", "fee": lambda total: "paid"}
+    assert program.run(globals, io.StringIO())["label"] == "cart: paid"
+    assert program.run(globals, io.StringIO())["label"] == "cart: paid"
+    assert calls == []
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_runs_in_threads_on_fresh_globals(engine):
+    # a and b are numbers in some runs and strings in others, so the same
+    # `+` nodes see both while the runs overlap
+    program = lox.compile(
+        """
+var seen = Map();
+fun add(a, b) { return a + b; }
+var sum = add(a, b);
+seen.set(sum, true);
+""",
+        engine=engine,
+    )
+    inputs = [{"a": i, "b": i} if i % 2 else {"a": str(i), "b": "!"} for i in range(64)]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(program.run, inputs))
+    for i, result in enumerate(results):
+        sum = 2.0 * i if i % 2 else f"{i}!"
+        assert result["sum"] == sum
+        assert result["seen"] == {sum: True}
+
+
+def test_errors():
+    with pytest.raises(lox.ProgramError) as error:
+        lox.compile("print 1 +;")
+    assert error.value.message == "[line 1] Error at ';': Expect expression.\n"
+
+    program = lox.compile("print -x;")
+    assert program.run({"x": 1})["x"] == 1.0
+    with pytest.raises(lox.ProgramError) as error:
+        program.run({"x": "a"})
+    assert error.value.message == "Operand must be a number.\n[line 1]\n"
@@ -0,0 +1,73 @@
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.stmt import Function
+
+
+def purity(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    return {s.name.lexeme: s.pure for s in statements if isinstance(s, Function)}
+
+
+def test_purity():
+    assert purity(
+        """
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+fun even(n) { if (n == 0) return true; return odd(n - 1); }
+fun odd(n) { if (n == 0) return false; return even(n - 1); }
+fun local(n) { var a = n; while (a > 0) a = a - 1; return a; }
+fun loud(n) { print n; return n; }
+fun callsLoud(n) { return loud(n); }
+fun readsGlobal(n) { return n + fib; }
+fun callsArgument(f) { return f(); }
+fun callsNative() { return clock(); }
+fun makesClosure() { fun inner() { return 1; } return inner; }
+fun getsField(o) { return o.field; }
+fun redefined() { return 1; }
+fun redefined() { return 2; }
+fun reassigned() { return 1; }
+reassigned = nil;
+"""
+    ) == {
+        "fib": True,
+        "even": True,
+        "odd": True,
+        "local": True,
+        "loud": False,
+        "callsLoud": False,
+        "readsGlobal": False,
+        "callsArgument": False,
+        "callsNative": False,
+        "makesClosure": False,
+        "getsField": False,
+        "redefined": False,
+        "reassigned": False,
+    }
+
+
+def test_purity_of_closures():
+    statements = Parser(
+        Scanner(
+            """
+fun outer(x) {
+  var captured = x;
+  fun readsCaptured() { return captured; }
+  fun writesCaptured() { captured = 1; return 1; }
+  fun pure(n) { return n * 2; }
+  fun callsPure(n) { return pure(n); }
+  return callsPure(x);
+}
+"""
+        ).scan_tokens()
+    ).parse()
+    Resolver().resolve(statements)
+    body = statements[0].body
+    inner = {s.name.lexeme: s.pure for s in body if isinstance(s, Function)}
+    assert inner == {
+        "readsCaptured": False,
+        "writesCaptured": False,
+        "pure": True,
+        "callsPure": True,
+    }
+    assert not statements[0].pure
@@ -0,0 +1,19 @@
+from lox.rope import ROPE_LENGTH, Rope, concat, equal
+
+
+def test_concat():
+    short = concat("a", "b")
+    assert short == "ab"
+    long = concat("a" * ROPE_LENGTH, "b")
+    assert type(long) is Rope
+    assert str(long) == "a" * ROPE_LENGTH + "b"
+
+    # both extend long, which must stay the same
+    x = concat(long, "x")
+    y = concat(long, "y")
+    assert str(x).endswith("bx") and str(y).endswith("by")
+    assert len(long) == ROPE_LENGTH + 1
+    assert str(concat("<", concat(x, y))) == "<" + str(x) + str(y)
+    assert equal(concat(long, "x"), x)
+    assert not equal(x, y)
+    assert not equal(x, 1.0)
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+RUN = Path(__file__).parent.parent / "run.py"
+
+
+def test_batch(tmp_path):
+    scripts = {
+        "defines.lox": "var x = 1; print x;",
+        "isolated.lox": "print x;",
+        "syntax.lox": "print ;",
+    }
+    for name, source in scripts.items():
+        (tmp_path / name).write_text(source)
+    (tmp_path / "manifest").write_text("# comment\nisolated.lox\n\nsyntax.lox\n")
+
+    result = subprocess.run(
+        [sys.executable, RUN, "--no-cache", "--jobs", "2"]
+        + ["defines.lox", "--manifest", "manifest", "missing.lox"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 70
+    assert result.stdout.startswith("1\n")
+    statuses = [line.split()[0] for line in result.stderr.splitlines()[:-1]]
+    assert [s for s in statuses if s.isdigit()] == ["0", "66", "70", "65"]
+    assert result.stderr.splitlines()[-1].startswith("4 scripts")
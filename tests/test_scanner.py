@@ -33,3 +33,10 @@ end
         for token in scanner.scan_tokens():
             expected_token = expected.readline().strip()
             assert str(token) ==  expected_token
+
+def test_iter_tokens():
+    tokens = Scanner('var s = "a\nb"; // comment\ns').iter_tokens()
+    assert next(tokens).lexeme == "var"
+    assert [(t.lexeme, t.line) for t in tokens] == [
+        ("s", 1), ("=", 1), ('"a\nb"', 2), (";", 2), ("s", 3), ("", 3)
+    ]
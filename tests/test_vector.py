@@ -0,0 +1,30 @@
+from lox.interpreter import Interpreter
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.vector import _compile
+
+
+def function(source):
+    interpreter = Interpreter()
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    interpreter.interpret(statements)
+    return interpreter.global_env.values["f"]
+
+
+def test_compile_arithmetic():
+    compiled = _compile(function("fun f(x) { return -(x - 1) * x / 2 + 3; }"))
+    assert compiled(5.0) == -7.0
+    assert _compile(function("fun f(x) { return 4; }"))(5.0) == 4.0
+
+
+def test_compile_rejects_other_functions():
+    for source in [
+        "fun f(x) { print x; return x; }",
+        "fun f(x) { return x < 1; }",
+        "var y = 1; fun f(x) { return x + y; }",
+        'fun f(x) { return x + "a"; }',
+        "fun f(x, y) { return x; }",
+    ]:
+        assert _compile(function(source)) is None
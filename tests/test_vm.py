@@ -0,0 +1,36 @@
+from lox.compiler import Compiler
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.scanner import Scanner
+from lox.vm import VM
+
+
+def compile_source(source):
+    statements = Parser(Scanner(source).scan_tokens()).parse()
+    Resolver().resolve(statements)
+    return statements
+
+
+def test_disassemble():
+    script = Compiler().compile(compile_source("var a = 1;\nprint a + 2;"))
+    assert script.chunk.disassemble() == [
+        "0000    1 CONSTANT 0 (1.0)",
+        "0002    1 DEFINE_GLOBAL 1",
+        "0004    2 GET_GLOBAL 2",
+        "0006    2 CONSTANT 3 (2.0)",
+        "0008    2 ADD",
+        "0009    2 PRINT",
+        "0010    2 NIL",
+        "0011    2 RETURN",
+    ]
+
+
+def test_deep_recursion_does_not_use_python_stack(capsys):
+    statements = compile_source(
+        """
+fun depth(n) { if (n == 0) return 0; return 1 + depth(n - 1); }
+print depth(20000);
+"""
+    )
+    VM.with_time().interpret(statements)
+    assert capsys.readouterr().out == "20000\n"